@@ -0,0 +1,172 @@
+"""
+This file holds the window and input backends the game loops draw through
+
+TdlBackend opens a tdl window and waits on tdl key events. HeadlessBackend draws into in-memory consoles and takes
+key events from a script, so the same loops run in tests, benchmarks and on servers with no display. Both give a
+root console that is shown and an offscreen console to draw on, present copies a rectangle of one to the other.
+"""
+from collections import deque
+
+import numpy as np
+
+import FrameBuffer as fb
+
+
+class KeyEvent:
+    """
+    key event with the fields KeyboardInput reads from tdl events
+    """
+    def __init__(self, type, key='', keychar=''):
+        """
+        :param type: 'KEYDOWN' or 'QUIT'
+        :param key: key name, 'CHAR' for a character key
+        :param keychar: character of the key, or it's name for other keys
+        """
+        self.type = type
+        self.key = key
+        self.keychar = keychar
+
+    def __repr__(self):
+        return 'KeyEvent({!r}, {!r}, {!r})'.format(self.type, self.key, self.keychar)
+
+
+def key_event(name):
+    """
+    make a key press like tdl gives
+    :param name: a single character like 'w', or a key name like 'ENTER' or 'UP'
+    :return: KeyEvent
+    """
+    if len(name) == 1:
+        return KeyEvent('KEYDOWN', 'CHAR', name)
+    return KeyEvent('KEYDOWN', name, name)
+
+
+class HeadlessConsole:
+    """
+    console kept in numpy arrays indexed [y, x] like tcod consoles, so FrameBuffer.upload copies to it in bulk
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.ch = np.full((height, width), fb.SPACE, dtype=np.int32)
+        self.fg = np.empty((height, width, 3), dtype=np.uint8)
+        self.fg[:] = fb.COLOR_DEFAULT_FG
+        self.bg = np.zeros((height, width, 3), dtype=np.uint8)
+
+    def draw_char(self, x, y, char, fg=Ellipsis, bg=Ellipsis):
+        """
+        draw one cell, like tdl, None keeps a colour and Ellipsis uses the default
+        """
+        self.ch[y, x] = ord(char) if isinstance(char, str) else char
+        if fg is not None:
+            self.fg[y, x] = fb.COLOR_DEFAULT_FG if fg is Ellipsis else fg
+        if bg is not None:
+            self.bg[y, x] = fb.COLOR_UNSEEN if bg is Ellipsis else bg
+
+    def clear(self, fg=Ellipsis, bg=Ellipsis):
+        self.ch[:] = fb.SPACE
+        self.fg[:] = fb.COLOR_DEFAULT_FG if fg is Ellipsis else fg
+        self.bg[:] = fb.COLOR_UNSEEN if bg is Ellipsis else bg
+
+    def blit(self, source, x=0, y=0, width=None, height=None, srcX=0, srcY=0):
+        """
+        copy a rectangle of another HeadlessConsole, arguments like tdl's blit
+        """
+        width = source.width - srcX if width is None else width
+        height = source.height - srcY if height is None else height
+        for name in ('ch', 'fg', 'bg'):
+            getattr(self, name)[y:y + height, x:x + width] = getattr(source, name)[srcY:srcY + height,
+                                                                                 srcX:srcX + width]
+
+    def to_text(self):
+        """
+        :return: the characters as a string, one line per row
+        """
+        return '\n'.join(''.join(map(chr, row)) for row in self.ch.tolist())
+
+    def to_arrays(self):
+        """
+        :return: dict of 'ch', 'fg' and 'bg' copies
+        """
+        return {'ch': self.ch.copy(), 'fg': self.fg.copy(), 'bg': self.bg.copy()}
+
+
+class HeadlessBackend:
+    """
+    backend with no window, input comes from a list of key events and runs out with a QUIT
+    """
+    def __init__(self, width, height, keys=()):
+        """
+        :param width: width in cells
+        :param height: height in cells
+        :param keys: key names for key_event or KeyEvents, given to the game in order
+        """
+        self.width = width
+        self.height = height
+        self.keys = deque(key_event(key) if isinstance(key, str) else key for key in keys)
+        self.console = None
+        self.frames = 0  # frames presented
+        self.closed = False
+
+    def create_consoles(self):
+        """
+        :return: root console, offscreen console
+        """
+        self.console = HeadlessConsole(self.width, self.height)
+        return self.console, HeadlessConsole(self.width, self.height)
+
+    def present(self, console, next_console, rect=None):
+        """
+        show a rectangle of the offscreen console
+        :param rect: (x, y, width, height), None for all of it
+        """
+        x, y, width, height = rect if rect is not None else (0, 0, self.width, self.height)
+        console.blit(next_console, x, y, width, height, x, y)
+        self.frames += 1
+
+    def wait_for_event(self):
+        """
+        :return: the next scripted KeyEvent, QUIT once they run out
+        """
+        if not self.keys:
+            self.closed = True
+            return KeyEvent('QUIT')
+        return self.keys.popleft()
+
+    def is_closed(self):
+        return self.closed
+
+
+class TdlBackend:
+    """
+    backend drawing to a tdl window, tdl is only imported when the window is made
+    """
+    def __init__(self, width, height, title='Room View'):
+        self.width = width
+        self.height = height
+        self.title = title
+        self.tdl = None
+
+    def create_consoles(self):
+        """
+        :return: root console, offscreen console
+        """
+        import tdl
+        self.tdl = tdl
+        console = tdl.init(self.width, self.height, title=self.title)
+        return console, tdl.Console(self.width, self.height)
+
+    def present(self, console, next_console, rect=None):
+        """
+        show a rectangle of the offscreen console
+        :param rect: (x, y, width, height), None for all of it
+        """
+        x, y, width, height = rect if rect is not None else (0, 0, self.width, self.height)
+        console.blit(next_console, x, y, width, height, x, y)
+        self.tdl.flush()
+
+    def wait_for_event(self):
+        return self.tdl.event.key_wait()
+
+    def is_closed(self):
+        return self.tdl.event.is_window_closed()
@@ -1,13 +1,17 @@
-import tdl
 import WorldMap as wm
 import PuzzleGenerator as pg
 import GamePiece as gp
 import KeyboardInput as ki
 import GameInventory as gi
+import LevelGenerator as lg
+import FrameBuffer as fb
+import Backends
 import random
+import numpy as np
 
 WIDTH = 50
 HEIGHT = 50
+FLOORS = 20
 
 def test_engine():
     """run test of world generation and placing a piece"""
@@ -17,8 +21,8 @@ def test_engine():
     chunk_map.place_tiles_from_chunk_map()
 
     dungeon = wm.WorldMap(50,50)
-    dungeon.load_transparent_map(chunk_map.tile_map_transparency)
-    dungeon.load_walk_map(chunk_map.tile_map_walkable)
+    dungeon.load_transparent_map(chunk_map.tile_map_transparency.T)
+    dungeon.load_walk_map(chunk_map.tile_map_walkable.T)
 
     points_available = dungeon.get_available_walk_spaces()
     print(points_available)
@@ -29,106 +33,117 @@ def test_engine():
     player.move_piece_to()
 
 
-def create_consoles():
-    # create console
-    console = tdl.init(WIDTH, HEIGHT, title='Room View')
-
-    # create next console in cycle
-    next_console = tdl.Console(WIDTH, HEIGHT)
-    #comment is comment
-
-    return console, next_console
-
-
-if __name__ == '__main__':
-    console, next_console = create_consoles()
-
-    cks = pg.chunk_library()
-    levels = {}
-
-    for i in range(20):
-        world = pg.ChunkMap(WIDTH, HEIGHT, 5, cks)
-        world.generate(50, 200)
-        world.place_tiles_from_chunk_map()
-
-        dungeon = wm.WorldMap(50, 50)
-        dungeon.load_transparent_map(world.tile_map_transparency)
-        dungeon.load_walk_map(world.tile_map_walkable)
-
-        if i == (20-1):
-            dungeon.set_stairs(False)
+class FrameRenderer:
+    """
+    draws frames of a level onto a console, only copying the cells that changed since the last frame
+
+    cells can only change inside the view of the last frame or this one, or where the player was or is, so only the
+    rectangle around those is composed again and compared with what the console shows. Changing level composes
+    everything
+    """
+    def __init__(self, console):
+        """
+        :param console: console to draw on, it keeps what was drawn between frames
+        """
+        self.console = console
+        self.level = None
+        self.view = ()  # points seen in the last frame
+        self.player_location = None
+        self.shown = None  # FrameBuffer.Frame of what the console shows
+        self.next = None  # FrameBuffer.Frame being composed
+
+    def _get_rect(self, player, view):
+        points = np.asarray(list(self.view) + list(view) + [self.player_location, player.location],
+                            dtype=np.intp).reshape(-1, 2)
+        left, top = points.min(axis=0).tolist()
+        right, bottom = points.max(axis=0).tolist()
+        return left, top, right - left + 1, bottom - top + 1
+
+    def draw(self, level, player, view):
+        """
+        draw one frame of a level: explored tiles, view, stairs, pieces and the player
+        :param level: WorldMap the player is on
+        :param player: player Piece
+        :param view: list of points the player can see, already added to the explored tiles
+        :return: (x, y, width, height) of the cells that were redrawn, None if nothing changed
+        """
+        if self.shown is None or self.shown.shape != level.explored.shape:
+            self.shown = fb.Frame(*level.explored.shape)
+            self.next = fb.Frame(*level.explored.shape)
+            self.level = None
+        first = level is not self.level
+        rect = None if first else self._get_rect(player, view)
+        fb.compose_level(self.next, level, player, view, rect)
+
+        self.level = level
+        self.view = view
+        self.player_location = tuple(player.location)
+
+        if first:
+            # nothing is known about the console yet or it shows another level, copy all of it
+            changed = None
+            rect = (0, 0) + level.explored.shape
         else:
-            dungeon.set_stairs()
-
-        # add pieces to dungeon
-        points_to_place = dungeon.get_available_walk_spaces()
-        for x in range(int(random.triangular(0,7,3))):
-            loc = random.choice(points_to_place)
-            inv = [gi.Item('gold','gold',int(random.triangular(1,100,20)))]
-            p = gi.Pile(dungeon,loc,color=(200,200,0), char='*',inventory=inv)
-            dungeon.add_piece(p)
+            changed = self.next.get_changed(self.shown, rect)
+            if not changed.any():
+                return None
+            # shrink to the cells that changed
+            x, y = rect[:2]
+            cells = np.argwhere(changed)
+            (left, top), (right, bottom) = cells.min(axis=0), cells.max(axis=0)
+            changed = changed[left:right + 1, top:bottom + 1]
+            rect = (x + int(left), y + int(top), int(right - left) + 1, int(bottom - top) + 1)
+
+        fb.upload(self.console, self.next, rect, changed)
+        self.shown.copy_from(self.next, rect)
+        return rect
+
+
+def draw_frame(next_console, level, player, view):
+    """
+    draws one whole frame of a level onto a console: explored tiles, view, stairs, pieces and the player
+    :param next_console: console to draw on
+    :param level: WorldMap the player is on
+    :param player: player Piece
+    :param view: list of points the player can see
+    :return: nothing, draws on next_console
+    """
+    FrameRenderer(next_console).draw(level, player, view)
+
+
+def run_game(backend, levels):
+    """
+    run the game loop until the window is closed or a QUIT event, the same frames with any backend
+    :param backend: Backends.TdlBackend, Backends.HeadlessBackend or anything like them
+    :param levels: LevelGenerator.LevelManager of the dungeon, closed when the game ends
+    :return: number of frames drawn
+    """
+    console, next_console = backend.create_consoles()
 
-
-        # add level to dungeon whole
-        levels[i]= dungeon
     player_level = 0
+    levels.prefetch_around(player_level)
 
-    points_available = levels[player_level].get_available_walk_spaces()
     player_start = levels[player_level].up_stairs
     player = gp.Piece(levels[player_level],player_start,color=(0,0,0),char='@')
     player_inventory = gi.Inventory()
+    renderer = FrameRenderer(next_console)
+    frames = 0
 
-    while not tdl.event.is_window_closed():
+    while not backend.is_closed():
 
         # get all explored tiles
         view = levels[player_level].get_view(player.location,5)
         levels[player_level].add_to_explored(view)
 
-        for i in range(HEIGHT):
-            for j in range(WIDTH):
-                next_console.draw_char(i,j,' ',bg=(0,0,0))
-
-        for tile in levels[player_level].explored:
-            next_console.draw_char(tile[0],tile[1],' ',bg=(40,40,40))
-
-        for tile in view:
-            next_console.draw_char(tile[0], tile[1], ' ', bg=(100, 100, 100))
-            
-        # render stairs
-        if levels[player_level].up_stairs in view:
-            next_console.draw_char(levels[player_level].up_stairs[0],levels[player_level].up_stairs[1],
-                                   char='^',fg=(255,255,255),bg=(100,100,100))
-        elif levels[player_level].up_stairs in levels[player_level].explored:
-            next_console.draw_char(levels[player_level].up_stairs[0], levels[player_level].up_stairs[1],
-                                   char='^', fg=(100, 100, 100), bg=(40, 40, 40))
-        else:
-            pass
-        # check if down stair is available
-        if levels[player_level].down_stairs:
-            if levels[player_level].down_stairs in view:
-                next_console.draw_char(levels[player_level].down_stairs[0],levels[player_level].down_stairs[1],
-                                       char='v',fg=(255,255,255),bg=(100,100,100))
-            elif levels[player_level].down_stairs in levels[player_level].explored:
-                next_console.draw_char(levels[player_level].down_stairs[0], levels[player_level].down_stairs[1],
-                                       char='v', fg=(100, 100, 100), bg=(40, 40, 40))
-            else:
-                pass
-
-        # draw pieces
-        for piece in levels[player_level].pieces:
-            if piece.location in view:
-                next_console.draw_char(piece.location[0],piece.location[1],char=piece.char,fg=piece.color,bg=(100,100,100))
-
-        # draw player
-        next_console.draw_char(player.location[0],player.location[1],player.char,
-                               fg=(255,255,0),bg=(100,100,100))
-
-        console.blit(next_console)
-        tdl.flush()
+        # only the cells that changed are copied to the window
+        dirty = renderer.draw(levels[player_level], player, view)
+        if dirty is not None:
+            backend.present(console, next_console, dirty)
+        frames += 1
         # wait for next event
-        event = tdl.event.key_wait()
+        event = backend.wait_for_event()
         if event.type == 'QUIT':
-            raise SystemExit
+            break
         action = ki.get_action(event)
         player_x = player.location[0]
         player_y = player.location[1]
@@ -145,29 +160,34 @@ if __name__ == '__main__':
             if not levels[player_level].collides_with_map((player_x,player_y+1)):
                 player.move_piece_to((player_x,player_y+1))
         elif action == 'accept':
-            if player.location == levels[player_level].up_stairs:
+            if player.location == levels[player_level].up_stairs and player_level > 0:
                 player_level -= 1
                 player.move_piece_to(levels[player_level].down_stairs)
+                levels.prefetch_around(player_level)
             elif player.location == levels[player_level].down_stairs:
                 player_level += 1
                 player.move_piece_to(levels[player_level].up_stairs)
+                levels.prefetch_around(player_level)
             else:
                 pass
         elif action == 'pickup':
             loc = player.location
 
-            for pile in levels[player_level].pieces:
-                if loc == pile.location:
-                    if hasattr(pile,'inventory'):
-                        player_inventory.add_item(pile.inventory.inventory)
-                        levels[player_level].pieces.remove(pile)
-                        print(player_inventory.inventory[0].amount)
+            for pile in levels[player_level].get_pieces_at(loc):
+                if hasattr(pile,'inventory'):
+                    player_inventory.add_item(pile.inventory.inventory)
+                    levels[player_level].remove_piece(pile)
+                    print(player_inventory.inventory[0].amount)
 
 
         else:
             pass
 
+    levels.close()
+    return frames
 
 
-
-
+if __name__ == '__main__':
+    # floors are built when first needed, the floors next to the player are built in the background
+    levels = lg.LevelManager(random.randrange(2 ** 32), FLOORS, WIDTH, HEIGHT, 5, 50, 200)
+    run_game(Backends.TdlBackend(WIDTH, HEIGHT), levels)
@@ -0,0 +1,418 @@
+"""
+This file times the hot paths of the game headless, drawing through Backends.HeadlessBackend instead of a tdl window
+
+Every benchmark runs for every map size with a fixed seed, results are written as JSON so runs can be compared.
+
+python Benchmark.py --sizes 50 200 --output new.json --compare old.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+import PuzzleGenerator as pg
+import WorldMap as wm
+import GamePiece as gp
+import GameInventory as gi
+import LevelGenerator as lg
+import BasicEngine
+import Backends
+
+DEFAULT_SIZES = [50, 200, 500, 1000, 2000]
+CHUNK_SIZE = 5
+VIEW_RADIUS = 5
+VIEWERS = 100
+PATHS = 200
+AGENTS = 200
+GAME_KEYS = 100
+
+# built levels, keyed by (size, seed), shared by the benchmarks that only read them
+_LEVELS = {}
+
+
+def get_chunk_limit(size):
+    """
+    number of chunks to place for a size, enough to mostly fill the map
+    """
+    return int((size * size / CHUNK_SIZE ** 2) * .8)
+
+
+def build_level(size, seed):
+    """
+    build a ChunkMap and a WorldMap with stairs for a size, once per size and seed
+    :return: ChunkMap, WorldMap
+    """
+    if (size, seed) not in _LEVELS:
+        cks, match_index, _ = lg.get_library()
+        world = pg.ChunkMap(size, size, CHUNK_SIZE, cks, match_index, seed=seed)
+        world.generate(get_chunk_limit(size), 200)
+        world.place_tiles_from_chunk_map()
+
+        dungeon = wm.WorldMap(size, size, seed=seed)
+        dungeon.load_transparent_map(world.tile_map_transparency.T)
+        dungeon.load_walk_map(world.tile_map_walkable.T)
+        dungeon.load_chunk_map(world.chunk_map.T, world.rotation_map.T)
+        dungeon.set_stairs()
+        _LEVELS[(size, seed)] = (world, dungeon)
+    return _LEVELS[(size, seed)]
+
+
+# each benchmark takes size and seed, does it's setup and returns the function to time
+
+def bench_generate(size, seed):
+    cks, match_index, _ = lg.get_library()
+
+    def run():
+        world = pg.ChunkMap(size, size, CHUNK_SIZE, cks, match_index, seed=seed)
+        world.generate(get_chunk_limit(size), 200)
+    return run
+
+
+def bench_place_tiles(size, seed):
+    world, _ = build_level(size, seed)
+    return world.place_tiles_from_chunk_map
+
+
+def bench_load_walk_map(size, seed):
+    world, _ = build_level(size, seed)
+    dungeon = wm.WorldMap(size, size)
+    return lambda: dungeon.load_walk_map(world.tile_map_walkable.T)
+
+
+def bench_load_transparent_map(size, seed):
+    world, _ = build_level(size, seed)
+    dungeon = wm.WorldMap(size, size)
+    return lambda: dungeon.load_transparent_map(world.tile_map_transparency.T)
+
+
+def bench_walk_spaces(size, seed):
+    _, dungeon = build_level(size, seed)
+    return dungeon.get_available_walk_spaces
+
+
+def bench_set_stairs(size, seed):
+    world, _ = build_level(size, seed)
+    dungeon = wm.WorldMap(size, size, seed=seed)
+    dungeon.load_transparent_map(world.tile_map_transparency.T)
+    dungeon.load_walk_map(world.tile_map_walkable.T)
+    return dungeon.set_stairs
+
+
+def bench_get_view(size, seed):
+    _, dungeon = build_level(size, seed)
+    return lambda: dungeon.get_view(dungeon.up_stairs, VIEW_RADIUS)
+
+
+def bench_get_view_uncached(size, seed):
+    _, dungeon = build_level(size, seed)
+
+    def run():
+        dungeon.view_cache.clear()
+        dungeon.get_view(dungeon.up_stairs, VIEW_RADIUS)
+    return run
+
+
+def bench_get_views(size, seed):
+    # views of VIEWERS walkable points in one batch
+    _, dungeon = build_level(size, seed)
+    points = dungeon.sample_walk_spaces(VIEWERS)
+    return lambda: dungeon.get_views(points, VIEW_RADIUS)
+
+
+def bench_get_path(size, seed):
+    _, dungeon = build_level(size, seed)
+
+    def run():
+        dungeon.path_cache.clear()
+        dungeon.get_path(dungeon.up_stairs, dungeon.down_stairs)
+    return run
+
+
+def bench_chunk_graph(size, seed):
+    _, dungeon = build_level(size, seed)
+
+    def run():
+        dungeon.chunk_graph = None
+        dungeon.get_chunk_graph()
+    return run
+
+
+def bench_get_chunk_path(size, seed):
+    _, dungeon = build_level(size, seed)
+    dungeon.get_chunk_graph()
+    return lambda: dungeon.get_chunk_path(dungeon.up_stairs, dungeon.down_stairs)
+
+
+def bench_get_paths(workers, processes=False):
+    # PATHS paths between random walkable points, cache cleared every run
+    def factory(size, seed):
+        _, dungeon = build_level(size, seed)
+        pairs = list(zip(dungeon.sample_walk_spaces(PATHS), dungeon.sample_walk_spaces(PATHS)))
+
+        def run():
+            dungeon.path_cache.clear()
+            dungeon.get_paths(pairs, workers, processes)
+        return run
+    return factory
+
+
+def bench_flow_field(size, seed):
+    _, dungeon = build_level(size, seed)
+
+    def run():
+        dungeon.flow_fields.clear()
+        dungeon.get_flow_field([dungeon.up_stairs])
+    return run
+
+
+def bench_flow_field_moved(size, seed):
+    # the target moves one step from a kept field
+    _, dungeon = build_level(size, seed)
+    field = dungeon.get_flow_field([dungeon.up_stairs])
+    target = next(point for point in dungeon.get_walk_index() if field.get_distance(point) == 1)
+
+    def run():
+        dungeon.flow_fields.clear()
+        dungeon.flow_fields[field.targets] = field
+        dungeon.get_flow_field([target])
+    return run
+
+
+def bench_flow_field_steps(size, seed):
+    # next step of AGENTS pieces
+    _, dungeon = build_level(size, seed)
+    field = dungeon.get_flow_field([dungeon.up_stairs])
+    points = dungeon.sample_walk_spaces(AGENTS)
+    return lambda: field.get_steps(points)
+
+
+def bench_add_item(size, seed):
+    # size is the number of items added, a tenth of them new stacks
+    items = [gi.Item('item', 'item_{}'.format(i % max(size // 10, 1)), 1) for i in range(size)]
+
+    def run():
+        gi.Inventory().add_item(items)
+    return run
+
+
+def bench_draw_frame(size, seed):
+    _, dungeon = build_level(size, seed)
+    player = gp.Piece(dungeon, dungeon.up_stairs, color=(0, 0, 0), char='@')
+    console = Backends.HeadlessConsole(size, size)
+
+    def run():
+        view = dungeon.get_view(player.location, VIEW_RADIUS)
+        dungeon.add_to_explored(view)
+        BasicEngine.draw_frame(console, dungeon, player, view)
+    return run
+
+
+def bench_frame_renderer(size, seed):
+    # the player steps back and forth, only the changed cells are drawn
+    _, dungeon = build_level(size, seed)
+    start = dungeon.up_stairs
+    step = next(point for point in [(start[0] + 1, start[1]), (start[0] - 1, start[1]), (start[0], start[1] + 1),
+                                    (start[0], start[1] - 1), start] if not dungeon.collides_with_map(point))
+    player = gp.Piece(dungeon, start, color=(0, 0, 0), char='@')
+    renderer = BasicEngine.FrameRenderer(Backends.HeadlessConsole(size, size))
+
+    def run():
+        player.move_piece_to(step if player.location == start else start)
+        view = dungeon.get_view(player.location, VIEW_RADIUS)
+        dungeon.add_to_explored(view)
+        renderer.draw(dungeon, player, view)
+    return run
+
+
+def bench_upload(console_type):
+    # one whole level frame copied to a real console, checked once before timing
+    def factory(size, seed):
+        import FrameBuffer as fb
+
+        _, dungeon = build_level(size, seed)
+        player = gp.Piece(dungeon, dungeon.up_stairs, color=(0, 0, 0), char='@')
+        view = dungeon.get_view(player.location, VIEW_RADIUS)
+        dungeon.add_to_explored(view)
+        frame = fb.Frame(size, size)
+        fb.compose_level(frame, dungeon, player, view)
+        if console_type == 'tdl':
+            import tdl
+            console = tdl.Console(size, size)
+        else:
+            import tcod.console
+            console = tcod.console.Console(size, size)
+
+        fb.upload(console, frame)
+        # the seen cells and some others, read back through get_char on tdl consoles
+        points = list(view) + [tuple(point) for point in np.random.default_rng(seed).integers(0, size, (100, 2))]
+        for x, y in points:
+            if console_type == 'tdl':
+                cell = console.get_char(x, y)
+            else:
+                cell = int(console.ch[y, x]), tuple(console.fg[y, x].tolist()), tuple(console.bg[y, x].tolist())
+            if cell != (frame.char[x, y], tuple(frame.fg[x, y].tolist()), tuple(frame.bg[x, y].tolist())):
+                raise RuntimeError('{} console does not show the uploaded frame at {}'.format(console_type, (x, y)))
+        return lambda: fb.upload(console, frame)
+    return factory
+
+
+def bench_run_game(size, seed):
+    # GAME_KEYS scripted key presses through the whole game loop
+    levels = lg.LevelManager(seed, 2, size, size, CHUNK_SIZE, get_chunk_limit(size), 200, background=False)
+    keys = ['w', 'a', 's', 'd'] * (GAME_KEYS // 4)
+    return lambda: BasicEngine.run_game(Backends.HeadlessBackend(size, size, keys), levels)
+
+
+BENCHMARKS = [
+    ('ChunkMap.generate', bench_generate),
+    ('ChunkMap.place_tiles_from_chunk_map', bench_place_tiles),
+    ('WorldMap.load_walk_map', bench_load_walk_map),
+    ('WorldMap.load_transparent_map', bench_load_transparent_map),
+    ('WorldMap.get_available_walk_spaces', bench_walk_spaces),
+    ('WorldMap.set_stairs', bench_set_stairs),
+    ('WorldMap.get_view', bench_get_view),
+    ('WorldMap.get_view uncached', bench_get_view_uncached),
+    ('WorldMap.get_views', bench_get_views),
+    ('WorldMap.get_path', bench_get_path),
+    ('WorldMap.get_chunk_graph', bench_chunk_graph),
+    ('WorldMap.get_chunk_path', bench_get_chunk_path),
+    ('WorldMap.get_paths 1 worker', bench_get_paths(1)),
+    ('WorldMap.get_paths threads', bench_get_paths(None)),
+    ('WorldMap.get_paths processes', bench_get_paths(None, processes=True)),
+    ('WorldMap.get_flow_field', bench_flow_field),
+    ('WorldMap.get_flow_field moved', bench_flow_field_moved),
+    ('FlowField.get_steps', bench_flow_field_steps),
+    ('Inventory.add_item', bench_add_item),
+    ('BasicEngine.draw_frame', bench_draw_frame),
+    ('BasicEngine.FrameRenderer.draw', bench_frame_renderer),
+    ('BasicEngine.run_game headless', bench_run_game),
+    ('FrameBuffer.upload tcod', bench_upload('tcod')),
+    ('FrameBuffer.upload tdl', bench_upload('tdl')),
+]
+
+
+def time_function(function, repeat):
+    """
+    time a function
+    :param function: function with no arguments
+    :param repeat: number of runs
+    :return: list of run times in seconds
+    """
+    out = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        out.append(time.perf_counter() - start)
+    return out
+
+
+def run_benchmarks(sizes, seed=0, repeat=3, names=None):
+    """
+    run benchmarks for every size
+    :param sizes: list of map sizes, multiples of the chunk size
+    :param seed: seed for every level built
+    :param repeat: runs per benchmark and size
+    :param names: benchmark names to run, None for all
+    :return: results dict, ready for json
+    """
+    results = []
+    for name, factory in BENCHMARKS:
+        if names and name not in names:
+            continue
+        for size in sizes:
+            times = time_function(factory(size, seed), repeat)
+            results.append({'name': name, 'size': size, 'best': min(times), 'mean': sum(times) / len(times),
+                            'repeat': repeat})
+            print('{:40} {:6} {:12.6f}s'.format(name, size, min(times)))
+
+    return {'meta': {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+                     'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'seed': seed, 'sizes': list(sizes)},
+            'results': results}
+
+
+def check_views(sizes, seed=0, radius=VIEW_RADIUS):
+    """
+    check WorldMap.get_views gives the same points as tdl through get_view, from every walkable point of a
+    generated level, with and without light_walls
+    :param sizes: list of map sizes, multiples of the chunk size
+    :param seed: seed for every level built
+    :param radius: view radius
+    :return: list of (size, point, light_walls, points only get_view has, points only get_views has)
+    """
+    import FieldOfView as fv
+
+    out = []
+    for size in sizes:
+        _, dungeon = build_level(size, seed)
+        points = dungeon.get_available_walk_spaces()
+        for light_walls in (False, True):
+            windows = dungeon.get_views(points, radius, light_walls=light_walls)
+            for point, window in zip(points, windows):
+                tdl_view = set(dungeon.get_view(point, radius, light_walls=light_walls))
+                numpy_view = set(fv.window_to_points(window, point))
+                if tdl_view != numpy_view:
+                    out.append((size, point, light_walls, tdl_view - numpy_view, numpy_view - tdl_view))
+        print('{:40} {:6} {:12} mismatches'.format('WorldMap.get_views vs get_view', size,
+                                                   sum(1 for m in out if m[0] == size)))
+    return out
+
+
+def compare(results, baseline, threshold=1.25):
+    """
+    find benchmarks that got slower than a baseline run
+    :param results: results dict from run_benchmarks
+    :param baseline: results dict of an earlier run
+    :param threshold: ratio of best times counted as a regression
+    :return: list of (name, size, baseline best, best, ratio) for regressions
+    """
+    old = {(r['name'], r['size']): r['best'] for r in baseline['results']}
+    out = []
+    for r in results['results']:
+        key = (r['name'], r['size'])
+        if key in old and old[key] > 0:
+            ratio = r['best'] / old[key]
+            if ratio > threshold:
+                out.append((r['name'], r['size'], old[key], r['best'], ratio))
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='time the hot paths of the game')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='map sizes in tiles')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='+', help='benchmark names to run')
+    parser.add_argument('--output', default='benchmark_results.json', help='file to write results to')
+    parser.add_argument('--compare', help='results file of an earlier run to check for regressions')
+    parser.add_argument('--threshold', type=float, default=1.25, help='slowdown ratio flagged as a regression')
+    parser.add_argument('--check-views', action='store_true',
+                        help='check the numpy views match tdl on every size before timing')
+    args = parser.parse_args(argv)
+
+    for size in args.sizes:
+        if size % CHUNK_SIZE != 0:
+            parser.error('size {} is not a multiple of the chunk size {}'.format(size, CHUNK_SIZE))
+
+    if args.check_views and check_views(args.sizes, args.seed):
+        return 1
+
+    results = run_benchmarks(args.sizes, args.seed, args.repeat, args.only)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, size, old_best, best, ratio in regressions:
+            print('REGRESSION {} {}: {:.6f}s -> {:.6f}s ({:.2f}x)'.format(name, size, old_best, best, ratio))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
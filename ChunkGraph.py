@@ -0,0 +1,235 @@
+"""
+This file holds hierarchical pathfinding over the chunk grid a level was built from
+
+Every run of walkable tiles that crosses the edge between two chunks is an entrance, with a node on the tile either
+side of it. Nodes in the same chunk are joined by the steps between them inside the chunk, nodes either side of an
+entrance by one step. A path is searched for on this small graph first, then turned into tiles one chunk at a time
+by walking down the steps to the next node.
+
+Steps inside a chunk come from a breadth first search of just that chunk's tiles. They only depend on the chunk and
+it's rotation, so they are worked out once for each (chunk, rotation) and shared by every place it was stamped.
+Paths are as short as possible between entrances but can be a little longer than a tile by tile search.
+"""
+import heapq
+
+import numpy as np
+
+import MapAnalysis as ma
+
+MOVES = ((0, -1), (-1, 0), (1, 0), (0, 1))
+
+
+class ChunkGraph:
+    """
+    graph of the entrances between chunks of a walk map, answers long paths without searching every tile
+    """
+    def __init__(self, walk_map, chunk_size, chunk_map=None, rotation_map=None):
+        """
+        :param walk_map: 2d numpy array indexed like WorldMap points, nonzero is walkable
+        :param chunk_size: size of each chunk
+        :param chunk_map: numpy array of chunk keys the tiles were stamped from, None to tell chunks apart by
+        their tiles
+        :param rotation_map: numpy array of chunk rotations, needed with chunk_map
+        """
+        self.walk = np.asarray(walk_map) != 0
+        self.chunk_size = chunk_size
+        if self.walk.shape[0] % chunk_size or self.walk.shape[1] % chunk_size:
+            raise RuntimeError('chunk size {} does not fit map shape {}'.format(chunk_size, self.walk.shape))
+        self.grid_shape = (self.walk.shape[0] // chunk_size, self.walk.shape[1] // chunk_size)
+        if chunk_map is not None and np.shape(chunk_map) != self.grid_shape:
+            raise RuntimeError('chunk map shape {} does not match grid {}'.format(np.shape(chunk_map),
+                                                                                self.grid_shape))
+        self.chunk_map = chunk_map
+        self.rotation_map = rotation_map
+
+        self.fields = {}  # chunk key: {local (x,y): steps from it to every tile of the chunk}
+        self.nodes = []  # (x,y) of every node
+        self.node_ids = {}  # (x,y): node id
+        self.edges = []  # node id: list of (node id, steps)
+        self.chunk_nodes = {}  # chunk (x,y): list of node ids in it
+        self._build()
+
+    def _get_key(self, chunk):
+        """
+        key the steps inside a chunk are cached under, (chunk key, rotation) or the chunk's tiles
+        """
+        if self.chunk_map is not None:
+            return int(self.chunk_map[chunk]), int(self.rotation_map[chunk]) % 4
+        return self._get_block(chunk).tobytes()
+
+    def _get_block(self, chunk):
+        size = self.chunk_size
+        return self.walk[chunk[0] * size:(chunk[0] + 1) * size, chunk[1] * size:(chunk[1] + 1) * size]
+
+    def get_field(self, chunk, local):
+        """
+        steps from a tile to every tile of it's chunk without leaving it, cached per chunk key
+        :param chunk: (x,y) of the chunk in the grid
+        :param local: (x,y) of the tile inside the chunk
+        :return: int32 numpy array (chunk size, chunk size), -1 where it can not be reached
+        """
+        fields = self.fields.setdefault(self._get_key(chunk), {})
+        field = fields.get(local)
+        if field is None:
+            field = fields[local] = ma.bfs_distance(self._get_block(chunk), [local])
+        return field
+
+    def _add_node(self, point):
+        node = self.node_ids.get(point)
+        if node is None:
+            node = self.node_ids[point] = len(self.nodes)
+            self.nodes.append(point)
+            self.edges.append([])
+            chunk = (point[0] // self.chunk_size, point[1] // self.chunk_size)
+            self.chunk_nodes.setdefault(chunk, []).append(node)
+        return node
+
+    def _build(self):
+        size = self.chunk_size
+        for axis in (0, 1):
+            # tiles either side of every chunk edge across this axis
+            walk = self.walk if axis == 0 else self.walk.T
+            both = walk[size - 1:-1:size] & walk[size::size]
+            if not both.size:
+                continue
+            # runs of open edge, a run never crosses into the next chunk along the edge
+            along = np.arange(both.shape[1])
+            first = (along % size == 0)[None, :]
+            last = (along % size == size - 1)[None, :]
+            before = np.zeros_like(both)
+            before[:, 1:] = both[:, :-1]
+            after = np.zeros_like(both)
+            after[:, :-1] = both[:, 1:]
+            starts = np.argwhere(both & (~before | first))
+            ends = np.argwhere(both & (~after | last))
+            for (edge, start), (_, end) in zip(starts.tolist(), ends.tolist()):
+                middle = (start + end) // 2
+                near = (edge * size + size - 1, middle)
+                far = (edge * size + size, middle)
+                if axis == 1:
+                    near, far = near[::-1], far[::-1]
+                a, b = self._add_node(near), self._add_node(far)
+                self.edges[a].append((b, 1))
+                self.edges[b].append((a, 1))
+
+        # nodes in the same chunk, by steps inside it
+        for chunk, nodes in self.chunk_nodes.items():
+            for i, a in enumerate(nodes):
+                field = self.get_field(chunk, self._get_local(self.nodes[a]))
+                for b in nodes[i + 1:]:
+                    steps = int(field[self._get_local(self.nodes[b])])
+                    if steps >= 0:
+                        self.edges[a].append((b, steps))
+                        self.edges[b].append((a, steps))
+
+    def _get_chunk(self, point):
+        return point[0] // self.chunk_size, point[1] // self.chunk_size
+
+    def _get_local(self, point):
+        return point[0] % self.chunk_size, point[1] % self.chunk_size
+
+    def _walk_inside(self, start_point, end_point):
+        """
+        tiles from one point to another in the same chunk, walking down the steps to the end point
+        :return: list of (x,y) tuples, not including start_point, None if they are not joined inside the chunk
+        """
+        chunk = self._get_chunk(start_point)
+        field = self.get_field(chunk, self._get_local(end_point))
+        x, y = self._get_local(start_point)
+        steps = int(field[x, y])
+        if steps < 0:
+            return None
+        x0, y0 = chunk[0] * self.chunk_size, chunk[1] * self.chunk_size
+        out = []
+        while steps > 0:
+            for dx, dy in MOVES:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < self.chunk_size and 0 <= ny < self.chunk_size and field[nx, ny] == steps - 1:
+                    x, y, steps = nx, ny, steps - 1
+                    out.append((x0 + x, y0 + y))
+                    break
+        return out
+
+    def _get_exits(self, point):
+        """
+        nodes in a point's chunk it can reach without leaving the chunk
+        :return: list of (node id, steps)
+        """
+        chunk = self._get_chunk(point)
+        local = self._get_local(point)
+        out = []
+        for node in self.chunk_nodes.get(chunk, ()):
+            steps = int(self.get_field(chunk, self._get_local(self.nodes[node]))[local])
+            if steps >= 0:
+                out.append((node, steps))
+        return out
+
+    def get_path(self, start_point, end_point):
+        """
+        calculate a path from start point to end point over the chunk graph
+        :param start_point: (x,y)
+        :param end_point: (x,y)
+        :return: list of tuples of the path not including the start, like WorldMap.get_path, empty if there is none
+        """
+        start_point = (int(start_point[0]), int(start_point[1]))
+        end_point = (int(end_point[0]), int(end_point[1]))
+        if not (self.walk[start_point] and self.walk[end_point]):
+            return []
+        if self._get_chunk(start_point) == self._get_chunk(end_point):
+            path = self._walk_inside(start_point, end_point)
+            if path is not None:
+                return path
+
+        # A* from the start's exits to the end's exits, the end is node -1
+        goals = dict(self._get_exits(end_point))
+        if not goals:
+            return []
+        ex, ey = end_point
+        best = {}
+        came_from = {}
+        heap = []
+        for node, steps in self._get_exits(start_point):
+            best[node] = steps
+            came_from[node] = None
+            x, y = self.nodes[node]
+            heapq.heappush(heap, (steps + abs(x - ex) + abs(y - ey), steps, node))
+        while heap:
+            _, steps, node = heapq.heappop(heap)
+            if node == -1:
+                break
+            if steps > best.get(node, steps):
+                continue
+            links = self.edges[node]
+            if node in goals:
+                links = links + [(-1, goals[node])]
+            for other, cost in links:
+                total = steps + cost
+                if total < best.get(other, total + 1):
+                    best[other] = total
+                    came_from[other] = node
+                    x, y = end_point if other == -1 else self.nodes[other]
+                    heapq.heappush(heap, (total + abs(x - ex) + abs(y - ey), total, other))
+        else:
+            return []
+
+        # nodes from the start to the end, then tiles between each of them
+        route = []
+        node = came_from[-1]
+        while node is not None:
+            route.append(self.nodes[node])
+            node = came_from[node]
+        route.reverse()
+        route.append(end_point)
+
+        out = []
+        here = start_point
+        for point in route:
+            if point == here:
+                continue
+            if self._get_chunk(point) == self._get_chunk(here):
+                out.extend(self._walk_inside(here, point))
+            else:
+                # across an entrance
+                out.append(point)
+            here = point
+        return out
@@ -0,0 +1,264 @@
+"""
+This file handles the compiled chunk library format
+
+Chunks are authored as JSON, then compiled into one binary file that is memory mapped when loaded, so a library
+of thousands of chunks loads in milliseconds and worker processes share the same pages.
+
+authoring source:
+{"chunk_size": 5,
+ "chunks": [{"id": 1,
+             "walk": ["..#..", ...],          rows of tiles, '.' is walkable, '#' is not, or lists of 0 and 1
+             "transparent": ["..#..", ...],   optional, defaults to walk
+             "connections": ["E", "A", "E", "A"],
+             "match_strings": ["[zE]", "[zA]", "[zE]", "[zA]"]}, ...]}
+
+compiled file, little endian, every section starts on a 64 byte boundary:
+    header       magic, version, chunk count, chunk size, match string width
+    keys         int64 (n,)
+    tiles        uint8 (n, 2, 4, size, size), walk then transparent, for every rotation
+    connections  uint8 (n, 4) connection characters
+    match        uint8 (n, 4, match width) match strings, zero padded
+    canonical    uint8 (n, 4) lowest equivalent rotation for each rotation
+"""
+from collections.abc import Mapping
+import hashlib
+import json
+import struct
+import sys
+
+import numpy as np
+
+import PuzzleGenerator as pg
+
+MAGIC = b'RLCL'
+VERSION = 1
+HEADER = struct.Struct('<4sIIII')
+ALIGNMENT = 64
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _get_layout(chunk_count, chunk_size, match_width):
+    """
+    get the offset and shape of every section
+    :return: list of (name, dtype, shape, offset), total file size
+    """
+    sections = [('keys', '<i8', (chunk_count,)),
+                ('tiles', 'u1', (chunk_count, 2, 4, chunk_size, chunk_size)),
+                ('connections', 'u1', (chunk_count, 4)),
+                ('match', 'u1', (chunk_count, 4, match_width)),
+                ('canonical', 'u1', (chunk_count, 4))]
+    out = []
+    offset = _align(HEADER.size)
+    for name, dtype, shape in sections:
+        out.append((name, dtype, shape, offset))
+        offset = _align(offset + int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    return out, offset
+
+
+def _parse_tiles(rows):
+    """
+    reads authored tile rows, strings of '.' and '#' or lists of numbers
+    :return: numpy array of 0 and 1
+    """
+    out = []
+    for row in rows:
+        if isinstance(row, str):
+            out.append([1 if c == '.' else 0 for c in row])
+        else:
+            out.append([1 if v else 0 for v in row])
+    return np.array(out)
+
+
+def _format_tiles(array):
+    return [''.join('.' if v else '#' for v in row) for row in np.asarray(array)]
+
+
+def read_source(path):
+    """
+    read an authoring source file into a chunk dict
+    :param path: path of the JSON source
+    :return: dict of {num:Chunk}
+    """
+    with open(path) as f:
+        source = json.load(f)
+
+    out = {}
+    for entry in source['chunks']:
+        walk = _parse_tiles(entry['walk'])
+        transparent = _parse_tiles(entry.get('transparent', entry['walk']))
+        if walk.shape != (source['chunk_size'], source['chunk_size']) or transparent.shape != walk.shape:
+            raise RuntimeError('chunk {} does not match chunk size'.format(entry['id']))
+        out[int(entry['id'])] = pg.Chunk(walk, transparent, list(entry['connections']), list(entry['match_strings']))
+    return out
+
+
+def write_source(chunk_dict, path):
+    """
+    write a chunk dict as an authoring source file, for moving a library out of code
+    :param chunk_dict: dict of {num:Chunk}
+    :param path: path of the JSON source
+    :return: none
+    """
+    chunks = []
+    chunk_size = None
+    for key, chunk in chunk_dict.items():
+        chunk_size = chunk.walk_array.shape[0]
+        chunks.append({'id': int(key),
+                       'walk': _format_tiles(chunk.walk_array),
+                       'transparent': _format_tiles(chunk.transparent_array),
+                       'connections': list(chunk.connections),
+                       'match_strings': list(chunk.match_strings)})
+
+    with open(path, 'w') as f:
+        json.dump({'chunk_size': chunk_size, 'chunks': chunks}, f, indent=1)
+
+
+def write_library(chunk_dict, path):
+    """
+    compile a chunk dict into a library file
+    :param chunk_dict: dict of {num:Chunk}, all chunks the same size
+    :param path: path of the compiled file
+    :return: none
+    """
+    keys = list(chunk_dict.keys())
+    chunks = [chunk_dict[key] for key in keys]
+    chunk_size = chunks[0].walk_array.shape[0]
+    match_width = max(len(match_string) for chunk in chunks for match_string in chunk.match_strings)
+
+    arrays = {'keys': np.array(keys, dtype='<i8'),
+              'tiles': np.array([[[chunk.get_rotated_walkable_array(rotation) for rotation in range(4)],
+                                  [chunk.get_rotated_transparent_array(rotation) for rotation in range(4)]]
+                                 for chunk in chunks]) != 0,
+              'connections': np.array([[ord(c) for c in chunk.connections] for chunk in chunks]),
+              'match': np.array([[list(match_string.encode('ascii').ljust(match_width, b'\0'))
+                                  for match_string in chunk.match_strings] for chunk in chunks]),
+              'canonical': np.array([chunk.rotation_canonical for chunk in chunks])}
+
+    layout, size = _get_layout(len(keys), chunk_size, match_width)
+    data = bytearray(size)
+    data[:HEADER.size] = HEADER.pack(MAGIC, VERSION, len(keys), chunk_size, match_width)
+    for name, dtype, shape, offset in layout:
+        array = np.ascontiguousarray(arrays[name], dtype=dtype)
+        if array.shape != shape:
+            raise RuntimeError('{} of chunk library has shape {}, expected {}'.format(name, array.shape, shape))
+        data[offset:offset + array.nbytes] = array.tobytes()
+
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def compile_library(source_path, path):
+    """
+    compile an authoring source file into a library file
+    :param source_path: path of the JSON source
+    :param path: path of the compiled file
+    :return: none
+    """
+    write_library(read_source(source_path), path)
+
+
+class CompiledChunkLibrary(Mapping):
+    """
+    chunk dict backed by a memory mapped library file, Chunk objects are made the first time they are asked for
+    and their arrays are read only views of the file
+    """
+    def __init__(self, path):
+        """
+        :param path: path of the compiled file
+        """
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+
+        magic, version, chunk_count, chunk_size, match_width = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise RuntimeError('{} is not a version {} chunk library'.format(path, VERSION))
+        self.chunk_size = chunk_size
+
+        layout, size = _get_layout(chunk_count, chunk_size, match_width)
+        if len(self.data) < size:
+            raise RuntimeError('{} is truncated'.format(path))
+        self.sections = {}  # section name: read only view of the file
+        for name, dtype, shape, offset in layout:
+            length = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            self.sections[name] = self.data[offset:offset + length].view(dtype).reshape(shape)
+
+        self.positions = dict(zip(self.sections['keys'].tolist(), range(chunk_count)))
+        self.chunks = {}
+        self._library_hash = None
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    def __getitem__(self, key):
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            position = self.positions[key]
+            tiles = self.sections['tiles'][position]
+            match = self.sections['match'][position]
+            chunk = pg.Chunk.from_rotations(tiles[0], tiles[1],
+                                            [chr(c) for c in self.sections['connections'][position]],
+                                            [bytes(m).rstrip(b'\0').decode('ascii') for m in match],
+                                            self.sections['canonical'][position].tolist())
+            self.chunks[key] = chunk
+        return chunk
+
+    def get_match_strings(self):
+        """
+        get every distinct match string in the library
+        :return: list of strings
+        """
+        match = self.sections['match']
+        packed = np.ascontiguousarray(match).view('S{}'.format(match.shape[-1]))
+        return [m.decode('ascii') for m in np.unique(packed)]
+
+    def get_match_index(self, match_strings=('A', '[A-Za-z]')):
+        """
+        build the ChunkMatchIndex of the library from it's tables, without making Chunk objects
+        :param match_strings: extra match strings to compile up front
+        :return: ChunkMatchIndex
+        """
+        connections = np.ascontiguousarray(self.sections['connections']).view('S1').astype('U1')
+        unique = self.sections['canonical'] == np.arange(4)
+        tiles = self.sections['tiles']
+        return pg.ChunkMatchIndex.from_arrays(list(self.positions), connections, unique,
+                                              set(match_strings) | set(self.get_match_strings()),
+                                              tiles[:, 0], tiles[:, 1])
+
+    @property
+    def library_hash(self):
+        """
+        hash of the library file, used to key cached levels
+        """
+        if self._library_hash is None:
+            self._library_hash = hashlib.sha1(self.data).hexdigest()
+        return self._library_hash
+
+
+def load_library(path):
+    """
+    load a compiled library file
+    :param path: path of the compiled file
+    :return: CompiledChunkLibrary
+    """
+    return CompiledChunkLibrary(path)
+
+
+if __name__ == '__main__':
+    # python ChunkLibraryFile.py export chunks.json        writes chunk_library() as an authoring source
+    # python ChunkLibraryFile.py compile chunks.json chunks.lib
+    if len(sys.argv) == 3 and sys.argv[1] == 'export':
+        write_source(pg.chunk_library(), sys.argv[2])
+    elif len(sys.argv) == 4 and sys.argv[1] == 'compile':
+        compile_library(sys.argv[2], sys.argv[3])
+    else:
+        print('usage: ChunkLibraryFile.py export SOURCE | compile SOURCE LIBRARY')
+        raise SystemExit(1)
@@ -0,0 +1,201 @@
+"""
+This file holds a field of view engine written only with numpy, the engine itself does not need tdl
+
+Views are worked out for many viewers at once with the diamond raycasting tdl uses for fov='DIAMOND'. Each tile
+inherits an obscurity vector and error terms from the tiles next to it towards the viewer, so every tile one more
+step from the viewer only depends on the step before it. The steps are worked through in order, each as whole
+array operations over every viewer and every tile at that step. Like tdl, tiles further than the radius in a
+straight line are never seen, and light_walls lights the walls next to seen tiles afterwards.
+
+Views come back as windows, a bool array per viewer of side 2 * radius + 1 centred on the viewer, window[i, x, y]
+is the point (point[0] - radius + x, point[1] - radius + y) like WorldMap points.
+"""
+import numpy as np
+
+ALGORITHMS = ('DIAMOND',)
+
+# step tables, keyed by radius
+_STEP_TABLES = {}
+
+
+class StepTable:
+    """
+    the tiles of a view window in order of steps from the viewer, with the tiles each one takes it's input from
+    """
+    def __init__(self, radius):
+        """
+        :param radius: how far can be seen
+        """
+        self.radius = radius
+        self.side = 2 * radius + 1
+        dx, dy = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+        self.dx, self.dy = dx.ravel(), dy.ravel()
+        self.distance2 = self.dx * self.dx + self.dy * self.dy
+
+        # tiles the viewer could see, by steps, the viewer itself is step 0
+        steps = np.abs(self.dx) + np.abs(self.dy)
+        self.steps = []
+        for step in range(1, 2 * radius + 1):
+            index = np.flatnonzero((steps == step) & (self.distance2 <= radius * radius))
+            if not len(index):
+                continue
+            x, y = self.dx[index], self.dy[index]
+            # input along x is the tile one step closer in x, none on the x = 0 line, same for y
+            x_input = np.where(x != 0, index - np.sign(x) * self.side, -1)
+            y_input = np.where(y != 0, index - np.sign(y), -1)
+            self.steps.append((index, x_input, y_input))
+        self.center = radius * self.side + radius
+
+
+def get_step_table(radius):
+    """
+    gets the step table for a radius, built once
+    :param radius: how far can be seen
+    :return: StepTable
+    """
+    radius = int(radius)
+    if radius not in _STEP_TABLES:
+        _STEP_TABLES[radius] = StepTable(radius)
+    return _STEP_TABLES[radius]
+
+
+def _obscure(x_error, y_error, x_obscurity, y_obscurity):
+    return ((x_error > 0) & (x_error <= x_obscurity)) | ((y_error > 0) & (y_error <= y_obscurity))
+
+
+def _light_walls(seen, transparent, inside, table, radii):
+    """
+    light the walls next to seen tiles, looking away from the viewer in each quarter of the square around it
+    :param seen: bool numpy array (n, side, side), changed in place
+    :param transparent: bool numpy array (n, side, side) of the tiles
+    :param inside: bool numpy array (n, side, side), tiles on the map
+    :param table: StepTable
+    :param radii: int numpy array (n,)
+    """
+    dx = table.dx.reshape(table.side, table.side)
+    dy = table.dy.reshape(table.side, table.side)
+    square = inside & (np.abs(dx) <= radii[:, None, None]) & (np.abs(dy) <= radii[:, None, None])
+    walls = square & ~transparent
+    lit = np.zeros_like(seen)
+    for sx in (-1, 1):
+        for sy in (-1, 1):
+            quarter = square & (dx * sx >= 0) & (dy * sy >= 0)
+            source = seen & transparent & quarter
+            # shift the sources one tile away from the viewer along x, y and both
+            for mx, my in ((sx, 0), (0, sy), (sx, sy)):
+                shifted = np.zeros_like(source)
+                shifted[:, max(mx, 0):table.side + min(mx, 0), max(my, 0):table.side + min(my, 0)] = \
+                    source[:, max(-mx, 0):table.side + min(-mx, 0), max(-my, 0):table.side + min(-my, 0)]
+                lit |= shifted & quarter & walls
+    seen |= lit
+
+
+def compute_views(transparent, points, radii, fov='DIAMOND', light_walls=False):
+    """
+    work out the views of many viewers at once from the transparent array, the same tiles tdl's compute_fov gives
+    :param transparent: 2d numpy array indexed [x, y], nonzero can be seen through
+    :param points: list or (n, 2) array of (x,y) viewer points
+    :param radii: how far each viewer can see, one number for all of them or one per viewer, at least 1
+    :param fov: fov algorithm, only 'DIAMOND'
+    :param light_walls: include the walls at the edge of the view
+    :return: bool numpy array of windows (n, side, side), side is 2 * the largest radius + 1
+    """
+    if fov not in ALGORITHMS:
+        raise RuntimeError('fov algorithm {} is not one of {}'.format(fov, ALGORITHMS))
+    points = np.asarray(points, dtype=np.intp).reshape(-1, 2)
+    radii = np.broadcast_to(np.asarray(radii, dtype=np.intp), (len(points),))
+    radius = int(radii.max()) if len(points) else 0
+    table = get_step_table(radius)
+    count = len(points)
+    if not count:
+        return np.zeros((0, table.side, table.side), dtype=bool)
+
+    # tiles of every window, off the map is opaque
+    transparent = np.asarray(transparent) != 0
+    padded = np.zeros((transparent.shape[0] + 2 * radius, transparent.shape[1] + 2 * radius), dtype=np.int8)
+    padded[radius:radius + transparent.shape[0], radius:radius + transparent.shape[1]] = 1 + transparent
+    tiles = padded[points[:, 0, None] + radius + table.dx, points[:, 1, None] + radius + table.dy]  # (n, cells)
+    inside = tiles > 0
+    clear = tiles > 1
+    within = table.distance2[None, :] <= (radii * radii)[:, None]
+
+    # error and obscurity of every tile's ray, and which rays carry on to the next step
+    x_error = np.zeros(tiles.shape, dtype=np.int32)
+    y_error = np.zeros(tiles.shape, dtype=np.int32)
+    x_obscurity = np.zeros(tiles.shape, dtype=np.int32)
+    y_obscurity = np.zeros(tiles.shape, dtype=np.int32)
+    expanded = np.zeros(tiles.shape, dtype=bool)
+    expanded[:, table.center] = True
+    seen = np.zeros(tiles.shape, dtype=bool)
+    seen[:, table.center] = True
+
+    for index, x_input, y_input in table.steps:
+        has_x = (x_input >= 0) & expanded[:, np.maximum(x_input, 0)]
+        has_y = (y_input >= 0) & expanded[:, np.maximum(y_input, 0)]
+        added = (has_x | has_y) & inside[:, index] & within[:, index]
+
+        xe, ye = np.zeros((count, len(index)), dtype=np.int32), np.zeros((count, len(index)), dtype=np.int32)
+        xo, yo = np.zeros_like(xe), np.zeros_like(ye)
+
+        # take the error and obscurity of the input along x
+        ixe, iye, ixo, iyo = (a[:, np.maximum(x_input, 0)] for a in (x_error, y_error, x_obscurity, y_obscurity))
+        take = has_x & ((ixo != 0) | (iyo != 0)) & (ixe > 0)
+        xe, ye = np.where(take, ixe - iyo, xe), np.where(take, iye + iyo, ye)
+        xo, yo = np.where(take, ixo, xo), np.where(take, iyo, yo)
+        x_obscure = _obscure(ixe, iye, ixo, iyo)
+
+        # then the input along y
+        jxe, jye, jxo, jyo = (a[:, np.maximum(y_input, 0)] for a in (x_error, y_error, x_obscurity, y_obscurity))
+        take = has_y & ((jxo != 0) | (jyo != 0)) & (((jye > 0) & (yo == 0)) | ((jxe <= 0) & (jxo > 0) & (jye > 0)))
+        xe, ye = np.where(take, jxe + jxo, xe), np.where(take, jye - jxo, ye)
+        xo, yo = np.where(take, jxo, xo), np.where(take, jyo, yo)
+        y_obscure = _obscure(jxe, jye, jxo, jyo)
+
+        ignore = np.where(has_x & has_y, x_obscure & y_obscure, np.where(has_x, x_obscure, y_obscure))
+        # a wall that is reached starts it's own shadow
+        wall = added & ~ignore & ~clear[:, index]
+        x_abs, y_abs = np.abs(table.dx[index]), np.abs(table.dy[index])
+        xe, xo = np.where(wall, x_abs, xe), np.where(wall, x_abs, xo)
+        ye, yo = np.where(wall, y_abs, ye), np.where(wall, y_abs, yo)
+
+        x_error[:, index], y_error[:, index] = xe, ye
+        x_obscurity[:, index], y_obscurity[:, index] = xo, yo
+        expanded[:, index] = added & ~ignore
+        seen[:, index] = added & ~ignore & ~_obscure(xe, ye, xo, yo)
+
+    shape = (count, table.side, table.side)
+    seen = seen.reshape(shape)
+    if light_walls:
+        _light_walls(seen, clear.reshape(shape), inside.reshape(shape), table, radii)
+    return seen
+
+
+def window_to_points(window, point):
+    """
+    turn one viewer's window into a list of points, like WorldMap.get_view gives
+    :param window: 2d bool numpy array from compute_views
+    :param point: (x,y) point of the viewer
+    :return: tuple of (x,y) tuples
+    """
+    radius = window.shape[0] // 2
+    points = np.argwhere(window) + (point[0] - radius, point[1] - radius)
+    return tuple(map(tuple, points.tolist()))
+
+
+def window_to_mask(window, point, shape):
+    """
+    place one viewer's window on a mask the size of the map
+    :param window: 2d bool numpy array from compute_views
+    :param point: (x,y) point of the viewer
+    :param shape: shape of the map
+    :return: bool numpy array of shape
+    """
+    radius = window.shape[0] // 2
+    out = np.zeros(shape, dtype=bool)
+    x0, y0 = point[0] - radius, point[1] - radius
+    # clip the window to the map
+    left, top = max(x0, 0), max(y0, 0)
+    right, bottom = min(x0 + window.shape[0], shape[0]), min(y0 + window.shape[1], shape[1])
+    if left < right and top < bottom:
+        out[left:right, top:bottom] = window[left - x0:right - x0, top - y0:bottom - y0]
+    return out
@@ -0,0 +1,214 @@
+"""
+This file composes frames as numpy layers and copies them to a console in bulk
+
+A Frame holds a character, foreground and background layer, indexed [x, y] like WorldMap points. compose_level
+builds a level frame in a few whole array passes: unexplored, explored but not seen, seen, stairs, pieces, then the
+player. upload copies a frame to a console in one slice per layer through numpy arrays of it's cells indexed
+[y, x]. Consoles that have them like tcod consoles are written directly, tdl consoles get the frame copied to a tcod
+console first and blitted across in one call. Anything else gets one draw_char per changed cell.
+"""
+import numpy as np
+
+COLOR_UNSEEN = (0, 0, 0)
+COLOR_REMEMBERED = (40, 40, 40)
+COLOR_VISIBLE = (100, 100, 100)
+COLOR_DEFAULT_FG = (255, 255, 255)
+SPACE = ord(' ')
+
+# tcod consoles frames are staged on before a blit, keyed by frame shape
+_STAGES = {}
+
+
+class Frame:
+    """
+    character, foreground and background layers of a frame
+    """
+    def __init__(self, width, height):
+        """
+        :param width: width in cells
+        :param height: height in cells
+        """
+        self.char = np.full((width, height), SPACE, dtype=np.int32)  # unicode code points
+        self.fg = np.empty((width, height, 3), dtype=np.uint8)
+        self.fg[:] = COLOR_DEFAULT_FG
+        self.bg = np.zeros((width, height, 3), dtype=np.uint8)
+
+    @property
+    def shape(self):
+        return self.char.shape
+
+    def get_changed(self, other, rect=None):
+        """
+        cells that differ from another frame of the same size
+        :param other: Frame
+        :param rect: (x, y, width, height) to compare, None for the whole frame
+        :return: bool numpy array of the rect
+        """
+        xs, ys = get_slices(rect, self.shape)
+        return ((self.char[xs, ys] != other.char[xs, ys]) | (self.fg[xs, ys] != other.fg[xs, ys]).any(axis=-1) |
+                (self.bg[xs, ys] != other.bg[xs, ys]).any(axis=-1))
+
+    def copy_from(self, other, rect=None):
+        """
+        copy cells from another frame of the same size
+        :param other: Frame
+        :param rect: (x, y, width, height) to copy, None for the whole frame
+        :return: none
+        """
+        xs, ys = get_slices(rect, self.shape)
+        self.char[xs, ys] = other.char[xs, ys]
+        self.fg[xs, ys] = other.fg[xs, ys]
+        self.bg[xs, ys] = other.bg[xs, ys]
+
+    def to_text(self):
+        """
+        :return: the characters as a string, one line per row
+        """
+        return '\n'.join(''.join(map(chr, row)) for row in self.char.T.tolist())
+
+
+def get_slices(rect, shape):
+    """
+    :param rect: (x, y, width, height), None for the whole shape
+    :param shape: shape of the frame
+    :return: x slice, y slice
+    """
+    if rect is None:
+        return slice(0, shape[0]), slice(0, shape[1])
+    x, y, width, height = rect
+    return slice(x, x + width), slice(y, y + height)
+
+
+def _put(frame, rect, points, chars, fg, bg):
+    """
+    draw cells on a frame, skipping ones outside rect
+    :param points: (n, 2) array of (x,y)
+    :param chars: n code points or one
+    :param fg: n colours or one
+    :param bg: n colours or one
+    """
+    xs, ys = get_slices(rect, frame.shape)
+    points = np.asarray(points, dtype=np.intp).reshape(-1, 2)
+    inside = ((xs.start <= points[:, 0]) & (points[:, 0] < xs.stop) &
+              (ys.start <= points[:, 1]) & (points[:, 1] < ys.stop))
+    if not inside.all():
+        points = points[inside]
+        chars, fg, bg = (value if np.ndim(value) < ndim else np.asarray(value)[inside]
+                         for value, ndim in ((chars, 1), (fg, 2), (bg, 2)))
+    frame.char[points[:, 0], points[:, 1]] = chars
+    frame.fg[points[:, 0], points[:, 1]] = fg
+    frame.bg[points[:, 0], points[:, 1]] = bg
+
+
+def compose_level(frame, level, player, view, rect=None):
+    """
+    build a level frame: unexplored, explored but not seen, seen, stairs, pieces, then the player
+    :param frame: Frame the size of the level to draw on
+    :param level: WorldMap
+    :param player: player Piece
+    :param view: list of points the player can see, already added to the explored tiles
+    :param rect: (x, y, width, height) to compose, None for the whole frame
+    :return: none, draws on frame
+    """
+    xs, ys = get_slices(rect, frame.shape)
+    char, fg, bg = frame.char[xs, ys], frame.fg[xs, ys], frame.bg[xs, ys]
+    char[:] = SPACE
+    fg[:] = COLOR_DEFAULT_FG
+    bg[:] = COLOR_UNSEEN
+    bg[level.explored[xs, ys]] = COLOR_REMEMBERED
+
+    points = np.asarray(list(view), dtype=np.intp).reshape(-1, 2)
+    seen = np.zeros(char.shape, dtype=bool)
+    local = points - (xs.start, ys.start)
+    inside = ((local >= 0) & (local < char.shape)).all(axis=1)
+    seen[local[inside, 0], local[inside, 1]] = True
+    bg[seen] = COLOR_VISIBLE
+
+    # stairs, seen or remembered
+    view = set(view) if not isinstance(view, (set, frozenset)) else view
+    for stairs, symbol in ((level.up_stairs, '^'), (level.down_stairs, 'v')):
+        if stairs is None:
+            continue
+        if stairs in view:
+            _put(frame, rect, [stairs], ord(symbol), (255, 255, 255), COLOR_VISIBLE)
+        elif level.has_been_explored(stairs):
+            _put(frame, rect, [stairs], ord(symbol), (100, 100, 100), COLOR_REMEMBERED)
+
+    pieces = level.get_pieces_in_view(view)
+    if pieces:
+        _put(frame, rect, [piece.location for piece in pieces], [ord(piece.char) for piece in pieces],
+             [piece.color for piece in pieces], COLOR_VISIBLE)
+
+    _put(frame, rect, [player.location], ord(player.char), (255, 255, 0), COLOR_VISIBLE)
+
+
+def compose_tiles(frame, tiles, colors):
+    """
+    build a frame of plain tiles coloured by value, like the RenderPuzzle walk map preview
+    :param frame: Frame
+    :param tiles: int or bool numpy array indexed [x, y], the frame's shape
+    :param colors: dict of tile value: background colour
+    :return: none, draws on frame
+    """
+    lookup = np.zeros((max(colors) + 1, 3), dtype=np.uint8)
+    for value, color in colors.items():
+        lookup[value] = color
+    frame.char[:] = SPACE
+    frame.bg[:] = lookup[np.asarray(tiles).astype(np.intp)]
+
+
+def get_stage(shape):
+    """
+    gets a tcod console to copy frames to in bulk before blitting them to consoles without numpy cell arrays, one
+    per frame size
+    :param shape: shape of the frame
+    :return: tcod console, None if tcod is not installed
+    """
+    stage = _STAGES.get(shape)
+    if stage is None:
+        try:
+            import tcod.console
+        except ImportError:
+            return None
+        stage = _STAGES[shape] = tcod.console.Console(*shape)
+    return stage
+
+
+def _copy_cells(cells, frame, xs, ys):
+    cells.ch[ys, xs] = frame.char[xs, ys].T
+    cells.fg[ys, xs] = frame.fg[xs, ys].transpose(1, 0, 2)
+    cells.bg[ys, xs] = frame.bg[xs, ys].transpose(1, 0, 2)
+
+
+def upload(console, frame, rect=None, changed=None):
+    """
+    copy a frame to a console
+    :param console: console with numpy ch, fg and bg arrays indexed [y, x] like tcod consoles, a tdl console, or
+    anything with draw_char
+    :param frame: Frame
+    :param rect: (x, y, width, height) to copy, None for the whole frame
+    :param changed: bool numpy array of the rect, cells that need drawing on a console with draw_char, None for all
+    of them
+    :return: none
+    """
+    xs, ys = get_slices(rect, frame.shape)
+    if xs.start >= xs.stop or ys.start >= ys.stop:
+        return
+    if hasattr(console, 'ch') and hasattr(console, 'bg'):
+        _copy_cells(console, frame, xs, ys)
+        return
+
+    # tdl consoles, through a tcod console and one blit of the rect
+    stage = get_stage(frame.shape) if hasattr(console, 'console_c') else None
+    if stage is not None:
+        _copy_cells(stage, frame, xs, ys)
+        stage.blit(console, xs.start, ys.start, xs.start, ys.start, xs.stop - xs.start, ys.stop - ys.start)
+        return
+
+    if changed is None:
+        points = np.mgrid[xs, ys].reshape(2, -1).T
+    else:
+        points = np.argwhere(changed) + (xs.start, ys.start)
+    for x, y in points.tolist():
+        console.draw_char(x, y, chr(frame.char[x, y]), fg=tuple(frame.fg[x, y].tolist()),
+                          bg=tuple(frame.bg[x, y].tolist()))
@@ -17,13 +17,23 @@ class Piece:
         moves a piece to a new location
         :param point: point to change the piece's location
         :param map: map to move the piece to, if None, then same map currently on
-        :return: nothing, updates self.location
+        :return: nothing, updates self.location and the piece index of the map it is on
         """
+        old_map, old_location = self.map, self.location
         if map is not None:
             self.map = map
 
         self.location = point
 
+        # pieces that were put on their map are kept in it's index
+        if old_map is None or self not in old_map.pieces:
+            return
+        if old_map is self.map:
+            old_map.move_piece(self, old_location)
+        else:
+            old_map.remove_piece(self, old_location)
+            self.map.add_piece(self)
+
 
 class Stair(Piece):
     """
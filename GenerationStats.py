@@ -0,0 +1,105 @@
+"""
+This file holds the optional instrumentation of ChunkMap generation
+
+A ChunkMap given a GenerationStats records how long each phase took, how many attempts, failures and placements
+it made, the frontier size after every step and how full the map ended up. aggregate sums up the stats of many
+levels, for tuning chunk_limit and fail_limit against what they cost
+"""
+from time import perf_counter
+
+PHASES = ('seed', 'pick', 'match_string', 'match', 'place', 'stamp')
+
+
+class GenerationStats:
+    """
+    stats of generating one ChunkMap
+    """
+    def __init__(self):
+        self.timings = dict.fromkeys(PHASES, 0.0)  # phase: total seconds
+        self.attempts = 0
+        self.failures = 0
+        self.placements = 0
+        self.frontier_sizes = []  # frontier size after every step
+        self.fill_ratio = None
+        self.chunk_limit = None
+        self.fail_limit = None
+        self.mode = None
+
+    def start(self, mode, chunk_limit, fail_limit=None):
+        """
+        mark the start of generation
+        :param mode: name of the generation method
+        :param chunk_limit: chunk limit generation was given
+        :param fail_limit: fail limit generation was given
+        :return: perf_counter time to pass to lap
+        """
+        self.mode = mode
+        self.chunk_limit = chunk_limit
+        self.fail_limit = fail_limit
+        return perf_counter()
+
+    def lap(self, phase, since):
+        """
+        add the time since a perf_counter time to a phase
+        :param phase: name in PHASES
+        :param since: perf_counter time the phase started
+        :return: perf_counter time now, start of the next phase
+        """
+        now = perf_counter()
+        self.timings[phase] += now - since
+        return now
+
+    def finish(self, chunk_map, attempts, failures, placements):
+        """
+        record the results of generation
+        :param chunk_map: the ChunkMap that was generated
+        :param attempts: match attempts made
+        :param failures: attempts that found nothing to place
+        :param placements: chunks placed, not counting the seed chunk
+        :return: none
+        """
+        self.attempts = attempts
+        self.failures = failures
+        self.placements = placements
+        self.fill_ratio = float((chunk_map.chunk_map != 0).mean())
+
+    def to_dict(self):
+        """
+        :return: dict of all stats, ready for json
+        """
+        return {'mode': self.mode,
+                'chunk_limit': self.chunk_limit,
+                'fail_limit': self.fail_limit,
+                'timings': dict(self.timings),
+                'total_time': sum(self.timings.values()),
+                'attempts': self.attempts,
+                'failures': self.failures,
+                'placements': self.placements,
+                'frontier_sizes': list(self.frontier_sizes),
+                'fill_ratio': self.fill_ratio}
+
+
+def _summarize(values):
+    if not values:
+        return {'mean': None, 'min': None, 'max': None}
+    return {'mean': sum(values) / len(values), 'min': min(values), 'max': max(values)}
+
+
+def aggregate(stats_list):
+    """
+    sum up the stats of many generated levels
+    :param stats_list: list of GenerationStats
+    :return: dict of level count, mean/min/max of every count and phase time, and total time per phase
+    """
+    out = {'levels': len(stats_list),
+           'timings': {},
+           'total_timings': {}}
+    for phase in PHASES:
+        values = [stats.timings[phase] for stats in stats_list]
+        out['timings'][phase] = _summarize(values)
+        out['total_timings'][phase] = sum(values)
+    for name in ('attempts', 'failures', 'placements', 'fill_ratio'):
+        out[name] = _summarize([getattr(stats, name) for stats in stats_list if getattr(stats, name) is not None])
+    out['total_time'] = _summarize([sum(stats.timings.values()) for stats in stats_list])
+    out['max_frontier'] = _summarize([max(stats.frontier_sizes) for stats in stats_list if stats.frontier_sizes])
+    return out
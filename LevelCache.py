@@ -0,0 +1,170 @@
+"""
+This file handles the on disk cache of generated levels
+
+Every entry is a folder named by a content hash of everything that decides how a level comes out (seed, size,
+chunk size, generation limits and the chunk library). Arrays are saved as .npy files so they can be memory mapped
+back in, small values go in meta.json. The cache has a size cap, the least recently used entries are removed first.
+The last few entries handed out stay open in memory, so loading the same level again skips the files
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+META_FILE = 'meta.json'
+
+
+class LevelCache:
+    """
+    seed addressed cache of level arrays in a folder on disk
+    """
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, packed=False, open_entries=16):
+        """
+        :param directory: folder to keep entries in, made if missing
+        :param max_bytes: size cap of all entries, oldest used entries are removed past it
+        :param packed: ask for bit packed arrays when storing, smaller entries but they are not memory mapped
+        :param open_entries: how many read only entries to keep open in this process, 0 to always read the files
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.packed = packed
+        self.open_entries = open_entries
+        self.recent = OrderedDict()  # key: (arrays, values) of read only entries, oldest used first
+        os.makedirs(directory, exist_ok=True)
+
+    def __getstate__(self):
+        # worker processes open their own entries, memory maps should not be pickled as copies
+        state = self.__dict__.copy()
+        state['recent'] = OrderedDict()
+        return state
+
+    @staticmethod
+    def get_key(seed, width, height, chunk_size, library_hash, *extra):
+        """
+        make the key of a level
+        :param seed: level seed
+        :param width: width in tiles
+        :param height: height in tiles
+        :param chunk_size: size of each chunk
+        :param library_hash: hash of the chunk library, see PuzzleGenerator.library_hash
+        :param extra: anything else that changes the level, like generation limits
+        :return: hex string
+        """
+        key = repr((seed, width, height, chunk_size, library_hash) + extra)
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key)
+
+    def __contains__(self, key):
+        return os.path.exists(os.path.join(self._entry_path(key), META_FILE))
+
+    def get(self, key, mmap_mode='r'):
+        """
+        load an entry
+        :param key: key from get_key
+        :param mmap_mode: passed to np.load, 'r' memory maps arrays read only, None reads them into memory
+        :return: dict of name: numpy array, dict of meta values, or None, None if not cached
+        """
+        path = self._entry_path(key)
+        meta_path = os.path.join(path, META_FILE)
+
+        # only read only maps are shared between callers
+        if mmap_mode == 'r' and key in self.recent:
+            try:
+                os.utime(meta_path)
+            except OSError:
+                # removed by another process
+                del self.recent[key]
+            else:
+                self.recent.move_to_end(key)
+                return self.recent[key]
+
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            arrays = {}
+            for name in meta['arrays']:
+                arrays[name] = np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+        except (OSError, ValueError, KeyError):
+            return None, None
+
+        # mark as recently used for eviction
+        os.utime(meta_path)
+        if mmap_mode == 'r' and self.open_entries > 0:
+            self.recent[key] = (arrays, meta['values'])
+            if len(self.recent) > self.open_entries:
+                self.recent.popitem(last=False)
+        return arrays, meta['values']
+
+    def put(self, key, arrays, values=None):
+        """
+        save an entry, then evict old entries if the cache is over size
+        :param key: key from get_key
+        :param arrays: dict of name: numpy array
+        :param values: dict of json friendly values
+        :return: none
+        """
+        path = self._entry_path(key)
+        if os.path.exists(path):
+            return
+
+        # write to a temporary folder and rename it in, so readers never see half an entry
+        temp_path = tempfile.mkdtemp(dir=self.directory, prefix='.tmp')
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(temp_path, name + '.npy'), np.asarray(array))
+            with open(os.path.join(temp_path, META_FILE), 'w') as f:
+                json.dump({'arrays': list(arrays), 'values': values or {}}, f)
+            os.rename(temp_path, path)
+        except OSError:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            if not os.path.exists(path):
+                raise
+
+        self.evict()
+
+    def get_entries(self):
+        """
+        list entries with their size and last use
+        :return: list of (last use time, size in bytes, key), oldest first
+        """
+        out = []
+        for key in os.listdir(self.directory):
+            path = self._entry_path(key)
+            try:
+                last_used = os.path.getmtime(os.path.join(path, META_FILE))
+                size = sum(entry.stat().st_size for entry in os.scandir(path))
+            except OSError:
+                # temporary folders and entries removed by another process
+                continue
+            out.append((last_used, size, key))
+        out.sort()
+        return out
+
+    def evict(self):
+        """
+        remove least recently used entries until the cache fits in max_bytes
+        :return: none
+        """
+        entries = self.get_entries()
+        total = sum(size for _, size, _ in entries)
+        for last_used, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._entry_path(key), ignore_errors=True)
+            self.recent.pop(key, None)
+            total -= size
+
+    def clear(self):
+        """
+        remove every entry
+        :return: none
+        """
+        for _, _, key in self.get_entries():
+            shutil.rmtree(self._entry_path(key), ignore_errors=True)
+        self.recent.clear()
@@ -0,0 +1,325 @@
+"""
+This file builds dungeon levels, either one at a time, as a batch spread across a process pool, or on demand
+through a LevelManager
+
+Levels are built from an explicit seed each, so the same seeds give the same dungeon whatever the worker count,
+and a LevelCache can hand back a level that was already built from the same seed.
+Workers only send back compact LevelData (tile arrays, stairs and loot), the WorldMap objects are made in the
+parent process with build_world_map
+"""
+from concurrent.futures import ProcessPoolExecutor
+import random
+
+import numpy as np
+
+import PuzzleGenerator as pg
+import WorldMap as wm
+import GameInventory as gi
+from GenerationStats import GenerationStats
+
+# chunk library, it's match index and hash, built once per process
+_LIBRARY = None
+# version of LevelData.to_arrays, part of cache keys
+LEVEL_FORMAT = 3
+
+
+class LevelData:
+    """
+    compact result of building a level, everything needed to make the WorldMap
+    """
+    def __init__(self, seed, tile_flags, up_stairs, down_stairs, piles, chunk_map=None, rotation_map=None,
+                 stats=None):
+        """
+        :param seed: seed the level was built from
+        :param tile_flags: uint8 numpy array of PuzzleGenerator TILE_ flags, (height, width) like ChunkMap.tile_flags
+        :param up_stairs: (x,y) of up stairs
+        :param down_stairs: (x,y) of down stairs, None on the final floor
+        :param piles: list of ((x,y), gold amount) for loot piles
+        :param chunk_map: numpy array of chunk keys the level was built from
+        :param rotation_map: numpy array of chunk rotations the level was built from
+        :param stats: GenerationStats of building the level, None if not collected or loaded from cache
+        """
+        self.seed = seed
+        self.tile_flags = tile_flags
+        self.up_stairs = up_stairs
+        self.down_stairs = down_stairs
+        self.piles = piles
+        self.chunk_map = chunk_map
+        self.rotation_map = rotation_map
+        self.stats = stats
+
+    @property
+    def walk_map(self):
+        """
+        bool numpy array of walkable tiles, indexed [x, y] like WorldMap points
+        """
+        return ((self.tile_flags & pg.TILE_WALKABLE) != 0).T
+
+    @property
+    def transparent_map(self):
+        """
+        bool numpy array of transparent tiles, indexed [x, y] like WorldMap points
+        """
+        return ((self.tile_flags & pg.TILE_TRANSPARENT) != 0).T
+
+    def to_arrays(self, packed=False):
+        """
+        everything in the level as numpy arrays, for the level cache
+        :param packed: bit pack the tile flags, smaller on disk but they can not be memory mapped
+        :return: dict of name: numpy array
+        """
+        stairs = [self.up_stairs, self.down_stairs if self.down_stairs is not None else (-1, -1)]
+        piles = [(loc[0], loc[1], amount) for loc, amount in self.piles]
+        out = {'chunk_map': self.chunk_map,
+               'rotation_map': self.rotation_map,
+               'stairs': np.array(stairs, dtype=np.int64),
+               'piles': np.array(piles, dtype=np.int64).reshape(-1, 3)}
+        if packed:
+            out['tile_bits'] = pg.pack_tile_flags(self.tile_flags)
+            out['tile_shape'] = np.array(self.tile_flags.shape, dtype=np.int64)
+        else:
+            out['tile_flags'] = self.tile_flags
+        return out
+
+    @classmethod
+    def from_arrays(cls, seed, arrays):
+        """
+        rebuild level data from to_arrays output, unpacked tile flags are kept as given so memory maps stay
+        memory maps
+        :param seed: seed the level was built from
+        :param arrays: dict of name: numpy array
+        :return: LevelData
+        """
+        stairs = [tuple(int(v) for v in point) for point in arrays['stairs']]
+        down_stairs = stairs[1] if stairs[1] != (-1, -1) else None
+        piles = [((int(x), int(y)), int(amount)) for x, y, amount in arrays['piles']]
+        if 'tile_bits' in arrays:
+            tile_flags = pg.unpack_tile_flags(arrays['tile_bits'], int(arrays['tile_shape'][1]))
+        else:
+            tile_flags = arrays['tile_flags']
+        return cls(seed, tile_flags, stairs[0], down_stairs, piles, arrays['chunk_map'], arrays['rotation_map'])
+
+
+def get_library():
+    """
+    get the chunk library, it's match index and hash, built once per process
+    :return: chunk dict, ChunkMatchIndex, library hash
+    """
+    global _LIBRARY
+    if _LIBRARY is None:
+        cks = pg.chunk_library()
+        _LIBRARY = (cks, pg.ChunkMatchIndex(cks), pg.library_hash(cks))
+    return _LIBRARY
+
+
+def floor_seed(seed, floor):
+    """
+    derive the explicit seed of one level from the dungeon seed, without deriving the others
+    :param seed: dungeon seed
+    :param floor: floor number
+    :return: int seed
+    """
+    return int(np.random.SeedSequence(seed, spawn_key=(floor,)).generate_state(1)[0])
+
+
+def level_seeds(seed, count):
+    """
+    derive an explicit seed for every level from one dungeon seed
+    :param seed: dungeon seed
+    :param count: number of levels
+    :return: list of int seeds
+    """
+    return [floor_seed(seed, floor) for floor in range(count)]
+
+
+def generate_level(seed, width, height, chunk_size=5, chunk_limit=50, fail_limit=200, place_down=True,
+                   cache=None, collect_stats=False):
+    """
+    build one level from a seed
+    :param seed: int seed for the level
+    :param width: width in tiles
+    :param height: height in tiles
+    :param chunk_size: size of each chunk
+    :param chunk_limit: how many chunks to try to place
+    :param fail_limit: how many failed placements before generation stops
+    :param place_down: False for the final floor, which has no down stairs
+    :param cache: LevelCache to look the level up in and store it to, None to always build
+    :param collect_stats: record GenerationStats in the LevelData
+    :return: LevelData
+    """
+    cks, match_index, cks_hash = get_library()
+
+    if cache is not None:
+        key = cache.get_key(seed, width, height, chunk_size, cks_hash, chunk_limit, fail_limit, place_down,
+                            LEVEL_FORMAT)
+        arrays, values = cache.get(key)
+        if arrays is not None:
+            return LevelData.from_arrays(seed, arrays)
+
+    # separate random streams for the chunk map, the stairs and the loot
+    chunk_seed, stairs_seed, loot_seed = (int(s) for s in np.random.SeedSequence(seed).generate_state(3))
+
+    stats = GenerationStats() if collect_stats else None
+    world = pg.ChunkMap(width, height, chunk_size, cks, match_index, seed=chunk_seed, stats=stats)
+    world.generate(chunk_limit, fail_limit)
+    world.place_tiles_from_chunk_map()
+
+    # ChunkMap layers are (height, width), WorldMap takes them indexed [x, y]
+    dungeon = wm.WorldMap(width, height, seed=stairs_seed)
+    dungeon.load_transparent_map(world.tile_map_transparency.T)
+    dungeon.load_walk_map(world.tile_map_walkable.T)
+    dungeon.set_stairs(place_down)
+
+    # loot piles
+    loot_random = random.Random(loot_seed)
+    points_to_place = dungeon.sample_walk_spaces(int(loot_random.triangular(0, 7, 3)), loot_random)
+    piles = [(point, int(loot_random.triangular(1, 100, 20))) for point in points_to_place]
+
+    level = LevelData(seed, world.tile_flags, dungeon.up_stairs, dungeon.down_stairs, piles, world.chunk_map,
+                      world.rotation_map, stats)
+
+    if cache is not None:
+        cache.put(key, level.to_arrays(cache.packed))
+    return level
+
+
+def _generate_level_args(args):
+    return generate_level(*args)
+
+
+def generate_levels(seeds, width, height, chunk_size=5, chunk_limit=50, fail_limit=200, workers=None, cache=None,
+                    collect_stats=False):
+    """
+    build a whole dungeon, one level per seed, the last level has no down stairs
+    :param seeds: list of int seeds, see level_seeds
+    :param width: width in tiles
+    :param height: height in tiles
+    :param chunk_size: size of each chunk
+    :param chunk_limit: how many chunks to try to place per level
+    :param fail_limit: how many failed placements before generation of a level stops
+    :param workers: number of worker processes, None for one per core, 1 builds in this process
+    :param cache: LevelCache shared by the workers, None to always build
+    :param collect_stats: record GenerationStats in every LevelData, see GenerationStats.aggregate
+    :return: list of LevelData in the same order as seeds
+    """
+    jobs = [(seed, width, height, chunk_size, chunk_limit, fail_limit, i != len(seeds) - 1, cache, collect_stats)
+            for i, seed in enumerate(seeds)]
+
+    if workers == 1 or len(jobs) <= 1:
+        return [_generate_level_args(job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_generate_level_args, jobs))
+
+
+def build_world_map(level):
+    """
+    make the WorldMap for a level, with stairs and loot piles
+    :param level: LevelData
+    :return: WorldMap
+    """
+    width, height = level.walk_map.shape
+    dungeon = wm.WorldMap(width, height)
+    dungeon.load_transparent_map(level.transparent_map)
+    dungeon.load_walk_map(level.walk_map)
+    dungeon.up_stairs = level.up_stairs
+    dungeon.down_stairs = level.down_stairs
+    if level.chunk_map is not None:
+        dungeon.load_chunk_map(level.chunk_map.T, level.rotation_map.T)
+
+    for loc, amount in level.piles:
+        inv = [gi.Item('gold', 'gold', amount)]
+        dungeon.add_piece(gi.Pile(dungeon, loc, color=(200, 200, 0), char='*', inventory=inv))
+
+    return dungeon
+
+
+class LevelManager:
+    """
+    gives out the floors of a dungeon by number, building each floor the first time it is asked for
+
+    prefetch_around builds the floors next to the current one in a background process, so taking the stairs does
+    not have to wait on generation. Only floors that were asked for or prefetched are ever built
+    """
+    def __init__(self, seed, floor_count, width, height, chunk_size=5, chunk_limit=50, fail_limit=200,
+                 background=True, cache=None):
+        """
+        :param seed: dungeon seed, floor seeds come from floor_seed
+        :param floor_count: number of floors, the last floor has no down stairs
+        :param width: width in tiles
+        :param height: height in tiles
+        :param chunk_size: size of each chunk
+        :param chunk_limit: how many chunks to try to place per level
+        :param fail_limit: how many failed placements before generation of a level stops
+        :param background: build prefetched floors in a worker process, if False prefetch does nothing
+        :param cache: LevelCache to look floors up in and store them to, None to always build
+        """
+        self.seed = seed
+        self.floor_count = floor_count
+        self.settings = (width, height, chunk_size, chunk_limit, fail_limit)
+        self.cache = cache
+        self.levels = {}  # floor number: WorldMap
+        self.pending = {}  # floor number: Future of LevelData
+        self.executor = ProcessPoolExecutor(max_workers=1) if background else None
+
+    def __len__(self):
+        return self.floor_count
+
+    def __contains__(self, floor):
+        return floor in self.levels
+
+    def __getitem__(self, floor):
+        """
+        get a floor, waiting on it's prefetch or building it here if needed
+        :param floor: floor number
+        :return: WorldMap
+        """
+        if floor in self.levels:
+            return self.levels[floor]
+        if not 0 <= floor < self.floor_count:
+            raise KeyError(floor)
+
+        future = self.pending.pop(floor, None)
+        if future is not None:
+            level = future.result()
+        else:
+            level = _generate_level_args(self._get_job(floor))
+
+        self.levels[floor] = build_world_map(level)
+        return self.levels[floor]
+
+    def _get_job(self, floor):
+        width, height, chunk_size, chunk_limit, fail_limit = self.settings
+        return (floor_seed(self.seed, floor), width, height, chunk_size, chunk_limit, fail_limit,
+                floor != self.floor_count - 1, self.cache)
+
+    def prefetch(self, floor):
+        """
+        start building a floor in the background if it has not been built
+        :param floor: floor number
+        :return: none
+        """
+        if self.executor is None or not 0 <= floor < self.floor_count:
+            return
+        if floor in self.levels or floor in self.pending:
+            return
+        self.pending[floor] = self.executor.submit(_generate_level_args, self._get_job(floor))
+
+    def prefetch_around(self, floor):
+        """
+        start building the floors above and below a floor
+        :param floor: floor the player is on
+        :return: none
+        """
+        self.prefetch(floor + 1)
+        self.prefetch(floor - 1)
+
+    def close(self):
+        """
+        stop the background worker, dropping floors that have not started
+        :return: none
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.pending = {}
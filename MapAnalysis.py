@@ -0,0 +1,229 @@
+"""
+This file holds whole map analysis of walk maps with numpy: connected areas and step distances
+
+Walk maps are 2d arrays indexed like WorldMap points, map[x, y], nonzero is walkable. Movement is the 4 directions
+a piece can step in, so two points in the same area can always be walked between.
+
+Areas are found by union find over horizontal runs of walkable tiles, runs that touch in the next row are joined by
+hooking root to root and shortening every path until nothing changes, all in whole array steps. Distances are a
+breadth first search that expands the whole frontier each step. Flow fields keep the steps to a set of targets so
+any number of pieces can read their next step off them.
+"""
+import numpy as np
+
+
+def label_components(walk_map):
+    """
+    label the connected walkable areas of a walk map
+    :param walk_map: 2d numpy array, nonzero is walkable
+    :return: int32 numpy array of area labels (-1 for not walkable), int64 numpy array of area sizes by label
+    """
+    walk = np.asarray(walk_map) != 0
+    labels = np.full(walk.shape, -1, dtype=np.int32)
+
+    # number every horizontal run of walkable tiles
+    starts = walk.copy()
+    starts[:, 1:] &= ~walk[:, :-1]
+    run_count = int(starts.sum())
+    if run_count == 0:
+        return labels, np.zeros(0, dtype=np.int64)
+    run_ids = np.cumsum(starts.ravel()).reshape(walk.shape) - 1
+
+    # runs that touch the run below them, once per pair
+    touching = walk[:-1] & walk[1:]
+    pairs = np.unique(run_ids[:-1][touching] * run_count + run_ids[1:][touching])
+    a, b = np.divmod(pairs, run_count)
+
+    parent = np.arange(run_count)
+    while len(a):
+        root_a = parent[a]
+        root_b = parent[b]
+        # pairs already in one area stay that way, drop them
+        split = root_a != root_b
+        a, b, root_a, root_b = a[split], b[split], root_a[split], root_b[split]
+        if not len(a):
+            break
+        # hook the larger root onto the smaller one, so no loops can form
+        np.minimum.at(parent, np.maximum(root_a, root_b), np.minimum(root_a, root_b))
+        # point every run straight at it's root
+        while True:
+            grandparent = parent[parent]
+            if (grandparent == parent).all():
+                break
+            parent = grandparent
+
+    roots, run_labels = np.unique(parent, return_inverse=True)
+    labels[walk] = run_labels[run_ids[walk]]
+    sizes = np.bincount(labels[walk], minlength=len(roots)).astype(np.int64)
+    return labels, sizes
+
+
+def bfs_distance(walk_map, sources, limit=None):
+    """
+    number of steps from the nearest source to every walkable point
+    :param walk_map: 2d numpy array, nonzero is walkable
+    :param sources: list of (x,y) points to measure from
+    :param limit: stop after this many steps, None to cover the whole map
+    :return: int32 numpy array of steps, -1 for points that are not walkable, not reachable or past limit
+    """
+    walk = np.asarray(walk_map) != 0
+    height, width = walk.shape
+    # border of unwalkable tiles so neighbours never leave the array
+    padded = np.zeros((height + 2, width + 2), dtype=bool)
+    padded[1:-1, 1:-1] = walk
+    padded = padded.ravel()
+    distance = np.full(padded.shape, -1, dtype=np.int32)
+    offsets = np.array([-(width + 2), -1, 1, width + 2])
+
+    frontier = np.unique(np.array([(x + 1) * (width + 2) + y + 1 for x, y in sources], dtype=np.int64))
+    distance[frontier] = 0
+    step = 0
+    while len(frontier) and (limit is None or step < limit):
+        step += 1
+        neighbours = (frontier[:, None] + offsets).ravel()
+        neighbours = np.unique(neighbours[padded[neighbours] & (distance[neighbours] < 0)])
+        distance[neighbours] = step
+        frontier = neighbours
+
+    return distance.reshape(height + 2, width + 2)[1:-1, 1:-1].copy()
+
+
+def move_source(distance, source):
+    """
+    number of steps from a new source, worked out from the steps to an old single source
+
+    if the new source is k steps from the old one no point is more than k steps further from it, so starting every
+    point at it's old steps + k a search from the new source only has to visit the points that got closer
+    :param distance: int32 numpy array from bfs_distance with one source and no limit, not changed
+    :param source: new (x,y) source, walkable
+    :return: int32 numpy array like bfs_distance gives for [source]
+    """
+    height, width = distance.shape
+    moved = int(distance[source[0], source[1]])
+    if moved < 0:
+        raise RuntimeError('{} can not be reached from the old source'.format(source))
+    if moved == 0:
+        return distance.copy()
+
+    # border of -1 so neighbours never leave the array, points that could not be reached still can not be
+    padded = np.full((height + 2, width + 2), -1, dtype=np.int32)
+    padded[1:-1, 1:-1] = np.where(distance >= 0, distance + moved, -1)
+    padded = padded.ravel()
+    offsets = np.array([-(width + 2), -1, 1, width + 2])
+
+    frontier = np.array([(source[0] + 1) * (width + 2) + source[1] + 1], dtype=np.int64)
+    padded[frontier] = 0
+    step = 0
+    while len(frontier):
+        step += 1
+        neighbours = (frontier[:, None] + offsets).ravel()
+        neighbours = np.unique(neighbours[padded[neighbours] > step])
+        padded[neighbours] = step
+        frontier = neighbours
+
+    return padded.reshape(height + 2, width + 2)[1:-1, 1:-1].copy()
+
+
+class FlowField:
+    """
+    steps from every walkable point to the nearest of a set of targets, pieces walk downhill on it to reach them
+    """
+    def __init__(self, walk_map, targets, distance=None):
+        """
+        :param walk_map: 2d numpy array, nonzero is walkable
+        :param targets: list of (x,y) points
+        :param distance: steps to the targets if already known, None to search for them
+        """
+        self.targets = frozenset((int(x), int(y)) for x, y in targets)
+        self.distance = bfs_distance(walk_map, self.targets) if distance is None else distance
+
+    def move_target(self, target):
+        """
+        make the field for a new single target from this one, see move_source
+        :param target: (x,y) point reachable from this field's target
+        :return: FlowField
+        """
+        if len(self.targets) != 1:
+            raise RuntimeError('only a field with one target can be moved')
+        return FlowField(None, [target], move_source(self.distance, target))
+
+    def get_distance(self, point):
+        """
+        :param point: (x,y) tuple
+        :return: steps to the nearest target, -1 if it can not be reached
+        """
+        return int(self.distance[point[0], point[1]])
+
+    def get_steps(self, points):
+        """
+        next step towards the nearest target for many points at once
+        :param points: list or (n, 2) array of (x,y) points
+        :return: int numpy array (n, 2) of next points, points at a target or that can not reach one stay put
+        """
+        points = np.asarray(points, dtype=np.intp).reshape(-1, 2)
+        height, width = self.distance.shape
+        padded = np.full((height + 2, width + 2), -1, dtype=np.int32)
+        padded[1:-1, 1:-1] = self.distance
+        moves = np.array([(0, -1), (-1, 0), (1, 0), (0, 1)])
+
+        here = self.distance[points[:, 0], points[:, 1]]
+        neighbours = points[:, None, :] + moves[None, :, :]  # (n, 4, 2)
+        around = padded[neighbours[..., 0] + 1, neighbours[..., 1] + 1]
+        downhill = (around == (here - 1)[:, None]) & (here > 0)[:, None]
+        choice = np.argmax(downhill, axis=1)
+        return np.where(downhill.any(axis=1)[:, None], neighbours[np.arange(len(points)), choice], points)
+
+    def get_step(self, point):
+        """
+        next step towards the nearest target
+        :param point: (x,y) tuple
+        :return: (x,y) tuple, point itself if it is at a target or can not reach one
+        """
+        return tuple(self.get_steps([point])[0].tolist())
+
+
+class ComponentMap:
+    """
+    connected walkable areas of a walk map, answers if two points can reach each other without pathfinding
+    """
+    def __init__(self, walk_map):
+        """
+        :param walk_map: 2d numpy array, nonzero is walkable
+        """
+        self.labels, self.sizes = label_components(walk_map)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    @property
+    def largest(self):
+        """
+        label of the biggest area, None if nothing is walkable
+        """
+        if not len(self.sizes):
+            return None
+        return int(np.argmax(self.sizes))
+
+    def get_label(self, point):
+        """
+        :param point: (x,y) tuple
+        :return: label of the area the point is in, -1 if not walkable
+        """
+        return int(self.labels[point[0], point[1]])
+
+    def connected(self, start_point, end_point):
+        """
+        check if one point can be walked to from another
+        :param start_point: (x,y)
+        :param end_point: (x,y)
+        :return: True or false
+        """
+        label = self.get_label(start_point)
+        return label >= 0 and label == self.get_label(end_point)
+
+    def get_mask(self, label):
+        """
+        :param label: area label
+        :return: bool numpy array of the points in the area
+        """
+        return self.labels == label
@@ -1,6 +1,48 @@
 import numpy as np
+import hashlib
+import heapq
 import re
 import random
+from itertools import islice
+from time import perf_counter
+
+
+# bits of ChunkMap.tile_flags
+TILE_WALKABLE = 1
+TILE_TRANSPARENT = 2
+
+
+def tile_flags_from_layers(walk_array, transparent_array):
+    """
+    combine walk and transparency arrays into one uint8 array of TILE_ flags
+    :param walk_array: numpy array, nonzero is walkable
+    :param transparent_array: numpy array of the same shape, nonzero is transparent
+    :return: uint8 numpy array
+    """
+    out = (np.asarray(walk_array) != 0).astype(np.uint8)
+    out |= (np.asarray(transparent_array) != 0).astype(np.uint8) << 1
+    return out
+
+
+def pack_tile_flags(tile_flags):
+    """
+    bit pack tile flags for storing, one bit per tile per layer
+    :param tile_flags: uint8 array of TILE_ flags, (height, width)
+    :return: uint8 array (2, height, ceil(width / 8)), walk bits then transparent bits
+    """
+    layers = np.stack([(tile_flags & TILE_WALKABLE) != 0, (tile_flags & TILE_TRANSPARENT) != 0])
+    return np.packbits(layers, axis=-1)
+
+
+def unpack_tile_flags(packed, width):
+    """
+    undo pack_tile_flags
+    :param packed: uint8 array from pack_tile_flags
+    :param width: width of the map in tiles
+    :return: uint8 array of TILE_ flags, (height, width)
+    """
+    layers = np.unpackbits(packed, axis=-1, count=width)
+    return tile_flags_from_layers(layers[0], layers[1])
 
 
 class ChunkMap:
@@ -8,31 +50,47 @@ class ChunkMap:
     Contains information on map of chunks, including chunk map, connection map, match_map, available surroundings
     """
 
-    def __init__(self, width, height, chunk_size, chunk_dict):
+    def __init__(self, width, height, chunk_size, chunk_dict, match_index=None, seed=None, stats=None):
         """
         creates chunk map and prepares it for building
         :param width: width in total tiles
         :param height: height in total tiles
         :param chunk_size: size of each chunk
         :param chunk_dict: dict of {num:Chunk}
+        :param match_index: ChunkMatchIndex built from chunk_dict, built here if None
+        :param seed: seed for this map's random streams, None for an unseeded map
+        :param stats: GenerationStats to record generation in, None to skip instrumentation
         """
         self.width = width
         self.height = height
         self.chunk_size = chunk_size
         self.chunk_dict = chunk_dict
+        # compiled compatibility index, can be shared between maps using the same chunk dict
+        if match_index is None:
+            match_index = ChunkMatchIndex(chunk_dict)
+        self.match_index = match_index
+        # random streams of this map only, the same seed always gives the same map
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.np_random = np.random.default_rng(seed)
+        self.stats = stats
         self.chunk_map = None
         self.rotation_map = None
-        # final output maps
-        self.tile_map_walkable = np.zeros((self.height,self.width))
-        self.tile_map_transparency = np.zeros((self.height,self.width))
+        # final output map, one byte of TILE_ flags per tile, see tile_map_walkable and tile_map_transparency
+        self.tile_flags = np.zeros((self.height,self.width), dtype=np.uint8)
+        # TILE_ flag: read only layer made from tile_flags, dropped whenever ChunkMap writes tile_flags
+        self.tile_layers = {}
 
         self.start_point = None
-        self.next_available_points = []
+        self.next_available_points = Frontier()
+        # regex strings per chunk and rotation for match_to_list, built the first time it's used
         self.chunk_match_dict = {}
+        # how many candidate matches generation tried, and how many came up empty
+        self.match_attempts = 0
+        self.match_failures = 0
 
         # start the base map which will create the start point and available points
         self._build_map()
-        self.create_search_dicts()
 
         # match string for any boundary or empty
         self.boundary_match = 'A'
@@ -49,9 +107,10 @@ class ChunkMap:
             raise RuntimeError('chunk size will not work with map size')
 
         # build map of just chunks, world map can follow
-        self.chunk_map = np.zeros((int(self.height / self.chunk_size), int(self.width / self.chunk_size)))
+        self.chunk_map = np.zeros((int(self.height / self.chunk_size), int(self.width / self.chunk_size)), dtype=np.int32)
         # need array of rotation states in the map
-        self.rotation_map = np.zeros((int(self.height / self.chunk_size), int(self.width / self.chunk_size)))
+        self.rotation_map = np.zeros((int(self.height / self.chunk_size), int(self.width / self.chunk_size)),
+                                     dtype=np.uint8)
 
     def seed_map(self):
         """
@@ -60,21 +119,17 @@ class ChunkMap:
         """
         # set random start point for the chunks
         self.start_point = (
-        round(np.random.triangular(0, (self.height - 1) / self.chunk_size / 2, (self.height - 2) / self.chunk_size)),
-        round(np.random.triangular(0, (self.width - 1)/ self.chunk_size / 2, (self.width - 2)/ self.chunk_size)))
+        round(self.np_random.triangular(0, (self.height - 1) / self.chunk_size / 2, (self.height - 2) / self.chunk_size)),
+        round(self.np_random.triangular(0, (self.width - 1)/ self.chunk_size / 2, (self.width - 2)/ self.chunk_size)))
 
         # create seed chunk and seed rotation of chunk
-        seed_chunk = random.choice(list(self.chunk_dict.keys()))
-        seed_rotation = random.choice([0,1,2,3])
+        seed_chunk = self.random.choice(list(self.chunk_dict.keys()))
+        seed_rotation = self.random.choice(self.chunk_dict[seed_chunk].unique_rotations)
 
         # place seed chunk
         # print(self.start_point)
         self.place_chunk(seed_chunk,self.start_point, seed_rotation)
 
-        # self.next_available_points = self.get_surrounding(self.start_point)
-        # self.next_available_points = self.remove_out_of_bounds()
-        # self.next_available_points = self.remove_already_filled()
-
     def get_surrounding(self, point):
         """
         gets all surrounding locations to a tile
@@ -112,33 +167,13 @@ class ChunkMap:
         else:
             return False, value
 
-    def remove_out_of_bounds(self):
-        """
-        removes points in list that are below or above the bounds, this assumes square map
-        :return:
-        """
-        vmin = 0
-        # using height to set map scale
-        vmax = self.height / self.chunk_size
-        new_list = []
-        for point in self.next_available_points:
-
-            if (not self.constrain(point[0], vmin, vmax)[0]) and (not self.constrain(point[1], vmin, vmax)[0]):
-                new_list.append(point)
-
-        return new_list
-
-    def remove_already_filled(self) -> list:
+    def in_bounds(self, point):
         """
-        checks the array to see if a place is already filled (has a value other than zero
-        :return: output point list
+        checks if a point is inside the chunk map
+        :param point: (tuple) location in chunk array
+        :return: True or False
         """
-        output = []
-        for point in self.next_available_points:
-            if self.chunk_map[point] == 0:
-                output.append(point)
-
-        return output
+        return 0 <= point[0] < self.chunk_map.shape[0] and 0 <= point[1] < self.chunk_map.shape[1]
 
     def place_chunk(self, num, location, rotation):
         """
@@ -152,16 +187,19 @@ class ChunkMap:
         self.chunk_map[location] = num
         self.rotation_map[location] = rotation
 
-        self.next_available_points.extend(self.get_surrounding(location))
-        self.next_available_points = self.remove_out_of_bounds()
-        self.next_available_points = self.remove_already_filled()
+        # update frontier, chunk 0 reads as empty space so it's location stays available
+        if num != 0:
+            self.next_available_points.discard(location)
+        for point in self.get_surrounding(location):
+            if self.in_bounds(point) and self.chunk_map[point] == 0:
+                self.next_available_points.add(point)
 
     def pick_next_location(self):
         """
         randomly picks next location
         :return: point(tuple) fo next location
         """
-        return random.choice(self.next_available_points)
+        return self.next_available_points.choice(self.random)
 
     def get_match_string_for_location(self,location):
         """
@@ -188,7 +226,7 @@ class ChunkMap:
                     # if the chunk is an actual chunk, not empty or boundary
                     chunk_here = self.chunk_dict[chunk_name]
                     # get rotation at location
-                    rotation_of_chunk = self.rotation_map[point]
+                    rotation_of_chunk = int(self.rotation_map[point])
                     # get the match based on the side we are on, adding (or subtracting) 2 gets the opposite side of
                     # the chunk needed for this
                     match_string_needed = chunk_here.get_match_string(i - 2, rotation_of_chunk)
@@ -196,6 +234,38 @@ class ChunkMap:
                     created_match += match_string_needed
         return created_match
 
+    def get_match_mask_for_location(self, location):
+        """
+        create bitset of the (chunk, rotation) pairs that can be placed at a location, same rules as
+        get_match_string_for_location but looked up in the compiled match index instead of building a regex
+        :param location: (tuple) representing point in space
+        :return: int bitset, see ChunkMatchIndex
+        """
+        chunks_around = self.get_surrounding(location)
+        mask = self.match_index.full_mask
+
+        for i, point in enumerate(chunks_around):
+            if (self.constrain(point[0], 0, self.height)[0]) or (self.constrain(point[1], 0, self.width)[0]):
+                # off the map, only boundary connections allowed
+                side_match = self.boundary_match
+            else:
+                chunk_name = self.chunk_map[point]
+                if chunk_name == 0:
+                    side_match = self.empty_space_match
+                else:
+                    # match string of the opposite side of the neighbouring chunk
+                    side_match = self.chunk_dict[chunk_name].get_match_string(i - 2, int(self.rotation_map[point]))
+            mask &= self.match_index.get_side_mask(i, side_match)
+        return mask
+
+    def match_to_mask(self, mask):
+        """
+        randomly picks a chunk and rotation out of a bitset of candidates
+        :param mask: int bitset from get_match_mask_for_location
+        :return: dictionary key of match, rotation of match, None, None if nothing matches
+        """
+        return self.match_index.choose(mask, self.random)
+
     def match_to_list(self, match_wanted='[A-Z][A-Z][A-Z][A-Z]'):
         """
         Matches list in match wanted to a list of fields to match
@@ -210,16 +280,19 @@ class ChunkMap:
 
         # create search order here
         search_order = list(self.chunk_dict.keys())
-        random.shuffle(search_order)
+        self.random.shuffle(search_order)
 
         # compile regular expression
         search_term = re.compile(match_wanted)
 
+        if not self.chunk_match_dict:
+            self.create_search_dicts()
+
         for k in search_order:
 
             # search dicts of chunks in order
-            rotations_shuffled = [0,1,2,3]
-            random.shuffle(rotations_shuffled)
+            rotations_shuffled = list(self.chunk_match_dict[k])
+            self.random.shuffle(rotations_shuffled)
 
             for side in rotations_shuffled:
                 if search_term.fullmatch(self.chunk_match_dict[k][side]) is not None:
@@ -241,8 +314,8 @@ class ChunkMap:
 
     def place_tiles_from_chunk(self,location):
         # first get arrays needed
-        chunk_id = self.chunk_map[location]
-        chunk_rotation = self.rotation_map[location]
+        chunk_id = int(self.chunk_map[location])
+        chunk_rotation = int(self.rotation_map[location])
         chunk = self.chunk_dict[chunk_id]
 
         walk_array = chunk.get_rotated_walkable_array(chunk_rotation)
@@ -254,29 +327,75 @@ class ChunkMap:
         y_end = y_start + self.chunk_size
         x_end = x_start + self.chunk_size
 
-        self.tile_map_walkable[y_start:y_end, x_start:x_end] = walk_array
-        self.tile_map_transparency[y_start:y_end, x_start:x_end] = transparent_array
+        self.tile_flags[y_start:y_end, x_start:x_end] = tile_flags_from_layers(walk_array, transparent_array)
+        self.tile_layers.clear()
 
     def place_tiles_from_chunk_map(self):
         """
         places all tiles from the chunk map
         :return: updates walk array and tile array with data from chunk array
         """
-        # get all points to place tiles from
-        locations = []
-        for i in range(int(self.height / self.chunk_size)):
-            for j in range(int(self.width / self.chunk_size)):
-                locations.append((i,j))
+        if self.match_index.walk_stack.shape[-1] != self.chunk_size:
+            raise RuntimeError('chunk size does not match the chunks in the chunk dict')
 
-        for location in locations:
-            self.place_tiles_from_chunk(location)
+        if self.stats is not None:
+            lap = perf_counter()
+
+        self.tile_flags[:, :] = self.match_index.stamp(self.match_index.flag_stack, self.chunk_map, self.rotation_map)
+        self.tile_layers.clear()
+
+        if self.stats is not None:
+            self.stats.lap('stamp', lap)
+
+    @property
+    def tile_map_walkable(self):
+        """
+        read only bool array of walkable tiles, made from tile_flags when first read after a change, assign a whole
+        array to change the map
+        """
+        return self._get_tile_layer(TILE_WALKABLE)
+
+    @tile_map_walkable.setter
+    def tile_map_walkable(self, walk_map):
+        self._set_tile_layer(TILE_WALKABLE, walk_map)
+
+    @property
+    def tile_map_transparency(self):
+        """
+        read only bool array of transparent tiles, made from tile_flags when first read after a change, assign a
+        whole array to change the map
+        """
+        return self._get_tile_layer(TILE_TRANSPARENT)
+
+    @tile_map_transparency.setter
+    def tile_map_transparency(self, transparent_map):
+        self._set_tile_layer(TILE_TRANSPARENT, transparent_map)
+
+    def _get_tile_layer(self, flag):
+        out = self.tile_layers.get(flag)
+        if out is None:
+            out = (self.tile_flags & flag) != 0
+            out.setflags(write=False)
+            self.tile_layers[flag] = out
+        return out
+
+    def _set_tile_layer(self, flag, values):
+        """
+        pack a layer into tile_flags
+        :param flag: TILE_ flag of the layer
+        :param values: numpy array the shape of tile_flags, nonzero sets the flag
+        """
+        values = np.broadcast_to(np.asarray(values) != 0, self.tile_flags.shape)
+        self.tile_flags[:] = np.where(values, self.tile_flags | flag, self.tile_flags & ~np.uint8(flag))
+        self.tile_layers.clear()
 
     def print_walk_map(self):
 
+        walk_map = self.tile_map_walkable
         for i in range(int(self.height)):
             line = ''
             for j in range(int(self.width)):
-                if self.tile_map_walkable[(i,j)] == 1:
+                if walk_map[(i,j)] == 1:
                     line += '.'
                 else:
                     line += '#'
@@ -288,17 +407,38 @@ class ChunkMap:
         :param chunk_limit: how many chunks to make into the map
         :return: updates chunk map as it works
         """
+        # timing is only done when stats are wanted
+        stats = self.stats
+        if stats is not None:
+            lap = stats.start('generate', chunk_limit, fail_limit)
+
         self.seed_map()
+        if stats is not None:
+            lap = stats.lap('seed', lap)
+
         fail_count = 0
+        attempts = 0
+        placements = 0
         for i in range(chunk_limit):
+            # stop if there is nowhere left to place
+            if not self.next_available_points:
+                break
+
             # get the next point to update
             next_point = self.pick_next_location()
+            if stats is not None:
+                lap = stats.lap('pick', lap)
 
-            # get the match string of the location of the next chunk
-            match_string_of_next_point = self.get_match_string_for_location(next_point)
+            # get the bitset of chunks that can go at the location of the next chunk
+            match_mask_of_next_point = self.get_match_mask_for_location(next_point)
+            if stats is not None:
+                lap = stats.lap('match_string', lap)
 
             # get new chunk number and rotation
-            new_chunk_key, new_chunk_rotation = self.match_to_list(match_string_of_next_point)
+            new_chunk_key, new_chunk_rotation = self.match_to_mask(match_mask_of_next_point)
+            attempts += 1
+            if stats is not None:
+                lap = stats.lap('match', lap)
 
             # check if no match was made
             if new_chunk_key is None:
@@ -307,13 +447,514 @@ class ChunkMap:
 
                 # if failed too many times, quit generation
                 if fail_count > fail_limit:
-
-                    return
+                    break
             else:
                 # if no problem, then place tile
                 self.place_chunk(new_chunk_key,next_point,new_chunk_rotation)
+                placements += 1
+                if stats is not None:
+                    lap = stats.lap('place', lap)
+
+            if stats is not None:
+                stats.frontier_sizes.append(len(self.next_available_points))
+
+        self.match_attempts += attempts
+        self.match_failures += fail_count
+        if stats is not None:
+            stats.finish(self, attempts, fail_count, placements)
+
+    def generate_constrained(self, chunk_limit, backtrack_limit=8):
+        """
+        generate chunkmap by always filling the most constrained frontier location first
+
+        every frontier location keeps a bitset of the (chunk, rotation) pairs still possible there. A location takes
+        the first option that leaves every empty neighbour something possible. Each placement goes on an undo stack
+        with the options it has not tried and the frontier and options it changed. When no option fits, placements
+        are undone newest first until one next to the location or it's empty neighbours finds another option that
+        fits, trying up to backtrack_limit of them. Other placements undone on the way are placed again later. Once
+        backtrack_limit * chunk_limit placements have been undone, the option with the fewest dead neighbours is
+        placed instead and they are dropped from the frontier. Chunk 0 reads as empty space so it is never placed here
+        :param chunk_limit: how many chunks to make into the map, counting the seed chunk
+        :param backtrack_limit: how many placements around a location to retry each time it has no option that fits
+        :return: number of match attempts made, also added to self.match_attempts
+        """
+        stats = self.stats
+        if stats is not None:
+            lap = stats.start('generate_constrained', chunk_limit)
+
+        self.seed_map()
+        attempts = self.match_attempts
+        failures = self.match_failures
+        # chunk 0 placements would leave the location empty
+        allowed = self.match_index.full_mask & ~self.match_index.get_chunk_mask(0)
+
+        # heap of (options left, tie breaker, location), stale entries are skipped when popped
+        domains = {}
+        heap = []
+        for point in self.next_available_points:
+            self._push_domain(point, allowed, domains, heap)
+        if stats is not None:
+            lap = stats.lap('seed', lap)
+
+        stack = []  # (options not tried, changes) of every placement, newest last
+        undo_budget = backtrack_limit * chunk_limit
+        # the seed chunk is not on the stack but counts against the limit
+        while len(stack) + 1 < chunk_limit and heap:
+            count, _, point = heapq.heappop(heap)
+            if self.chunk_map[point] != 0 or point not in domains or domains[point].bit_count() != count:
+                continue
+            if stats is not None:
+                lap = stats.lap('pick', lap)
+
+            best = self._place_first(point, self._order_options(domains[point]), allowed, domains, heap, stack)
+            if best[0] and undo_budget and stack:
+                # no option fits, undo earlier placements and come back to this location afterwards
+                heapq.heappush(heap, (count, self.random.random(), point))
+                # only placements next to the location or it's empty neighbours change what fits there
+                conflict = self._get_conflict(point)
+                retries = backtrack_limit
+                while stack and retries and undo_budget:
+                    undo_budget -= 1
+                    options, changes = stack.pop()
+                    self._undo_placement(changes, domains, heap)
+                    if changes[0] in conflict:
+                        retries -= 1
+                        placed = self._place_first(changes[0], options, allowed, domains, heap, stack)
+                        if placed is not None and not placed[0]:
+                            break
+            elif best[0]:
+                # out of undos, place the best option and give up on it's dead neighbours
+                changes, _ = self._place_option(point, best[1], best[2], allowed, domains)
+                self._queue_neighbours(changes, domains, heap)
+                stack.append((iter(()), changes))
+            if stats is not None:
+                lap = stats.lap('match', lap)
+                stats.frontier_sizes.append(len(self.next_available_points))
+
+        attempts = self.match_attempts - attempts
+        if stats is not None:
+            stats.finish(self, attempts, self.match_failures - failures, len(stack))
+        return attempts
+
+    def _push_domain(self, point, allowed, domains, heap):
+        """
+        recompute the options of a frontier location and queue it, drop it from the frontier if it has none
+        """
+        mask = self.get_match_mask_for_location(point) & allowed
+        if mask:
+            domains[point] = mask
+            heapq.heappush(heap, (mask.bit_count(), self.random.random(), point))
+        else:
+            domains.pop(point, None)
+            self.next_available_points.discard(point)
+            self.match_failures += 1
+
+    def _order_options(self, mask):
+        """
+        random order of the pairs in a bitset, by chunk then rotation, same odds as match_to_mask for the first
+        """
+        pairs = self.match_index.get_pairs(mask)
+        positions = self.match_index.get_chunk_positions(pairs).tolist()
+        self.random.shuffle(positions)
+        for position in positions:
+            rotations = np.flatnonzero(pairs[position]).tolist()
+            self.random.shuffle(rotations)
+            for rotation in rotations:
+                yield self.match_index.keys[position], rotation
+
+    def _get_conflict(self, point):
+        """
+        locations whose chunks decide the options of a location and of it's empty neighbours
+        """
+        out = set(self.get_surrounding(point))
+        for neighbour in self.get_surrounding(point):
+            if self.in_bounds(neighbour) and self.chunk_map[neighbour] == 0:
+                out.update(self.get_surrounding(neighbour))
+        return out
+
+    def _place_first(self, point, options, allowed, domains, heap, stack):
+        """
+        place the first option that leaves every empty neighbour something possible and push it on the stack
+        :param options: iterator of (chunk, rotation), what is left of it is kept on the stack for backtracking
+        :return: (dead neighbours, chunk, rotation) of the option placed, dead neighbours is 0, or else of the
+        option tried with the fewest, None if there were no options left to try
+        """
+        best = None
+        for key, rotation in options:
+            self.match_attempts += 1
+            changes, dead = self._place_option(point, key, rotation, allowed, domains)
+            if not dead:
+                self._queue_neighbours(changes, domains, heap)
+                stack.append((options, changes))
+                return 0, key, rotation
+            self._undo_placement(changes, domains)
+            if best is None or dead < best[0]:
+                best = (dead, key, rotation)
+        return best
+
+    def _place_option(self, point, key, rotation, allowed, domains):
+        """
+        place a chunk and recompute the options of the frontier around it, undone by _undo_placement
+        :return: changes, how many neighbours were left with no options
+        """
+        frontier = self.next_available_points
+        added = [neighbour for neighbour in self.get_surrounding(point)
+                 if self.in_bounds(neighbour) and self.chunk_map[neighbour] == 0 and neighbour not in frontier]
+        old_domains = {point: domains.pop(point, None)}
+        self.place_chunk(key, point, rotation)
+        dead = 0
+        for neighbour in self.get_surrounding(point):
+            if neighbour in frontier:
+                old_domains[neighbour] = domains.get(neighbour)
+                domains[neighbour] = self.get_match_mask_for_location(neighbour) & allowed
+                dead += not domains[neighbour]
+        # placed location, frontier locations added, options before, locations dropped afterwards
+        return (point, added, old_domains, []), dead
+
+    def _queue_neighbours(self, changes, domains, heap):
+        """
+        queue the neighbours of a kept placement with their new options, drop the ones with none
+        """
+        point, _, old_domains, dropped = changes
+        for neighbour in old_domains:
+            if neighbour == point:
+                continue
+            mask = domains[neighbour]
+            if mask:
+                heapq.heappush(heap, (mask.bit_count(), self.random.random(), neighbour))
+            else:
+                del domains[neighbour]
+                self.next_available_points.discard(neighbour)
+                dropped.append(neighbour)
+                self.match_failures += 1
+
+    def _undo_placement(self, changes, domains, heap=None):
+        """
+        take a placement back off the map, putting back the frontier and options it changed
+        :param heap: heap to queue the restored options on, None if they were never queued
+        """
+        point, added, old_domains, dropped = changes
+        self.chunk_map[point] = 0
+        self.rotation_map[point] = 0
+        frontier = self.next_available_points
+        for neighbour in dropped:
+            frontier.add(neighbour)
+        for neighbour in added:
+            frontier.discard(neighbour)
+        frontier.add(point)
+        for location, mask in old_domains.items():
+            if mask is None:
+                domains.pop(location, None)
+            else:
+                domains[location] = mask
+                if heap is not None:
+                    heapq.heappush(heap, (mask.bit_count(), self.random.random(), location))
+
+
+
+
+class Frontier:
+    """
+    indexed set of points, O(1) add, discard and random pick. Used for the chunk map locations available for the
+    next placement, and by WorldMap for it's walkable tiles
+
+    points are kept in a list for picking, with a dict of point to list position so a removed point can be
+    swapped with the last one
+    """
+
+    def __init__(self, points=()):
+        self.points = list(points)
+        self.positions = dict(zip(self.points, range(len(self.points))))
+        if len(self.positions) != len(self.points):
+            # repeated points, add them one at a time
+            points, self.points, self.positions = self.points, [], {}
+            for point in points:
+                self.add(point)
+
+    def __len__(self):
+        return len(self.points)
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def __contains__(self, point):
+        return point in self.positions
+
+    def __repr__(self):
+        return 'Frontier({})'.format(self.points)
+
+    def add(self, point):
+        """
+        adds a point, does nothing if already there
+        :param point: (tuple) location in chunk array
+        :return: none
+        """
+        if point not in self.positions:
+            self.positions[point] = len(self.points)
+            self.points.append(point)
+
+    def discard(self, point):
+        """
+        removes a point if it is there
+        :param point: (tuple) location in chunk array
+        :return: none
+        """
+        position = self.positions.pop(point, None)
+        if position is None:
+            return
+        last = self.points.pop()
+        if position < len(self.points):
+            # move last point into the hole
+            self.points[position] = last
+            self.positions[last] = position
+
+    def choice(self, rng=random):
+        """
+        uniform random pick
+        :param rng: random module or random.Random instance
+        :return: point (tuple)
+        """
+        return self.points[rng.randrange(len(self.points))]
+
+    def shuffled(self, rng=random):
+        """
+        yields the points in a uniform random order without repeats, a lazy Fisher-Yates shuffle so each point
+        costs O(1) and the points are not copied. Do not add or discard points while using it
+        :param rng: random module or random.Random instance
+        :return: generator of points (tuple)
+        """
+        swapped = {}  # list position: point moved there by an earlier step
+        count = len(self.points)
+        for i in range(count):
+            j = rng.randrange(i, count)
+            point = swapped.get(j, self.points[j])
+            swapped[j] = swapped.get(i, self.points[i])
+            yield point
+
+    def sample(self, k, rng=random):
+        """
+        pick k distinct points in O(k)
+        :param k: number of points
+        :param rng: random module or random.Random instance
+        :return: list of points, all of them if there are fewer than k
+        """
+        return list(islice(self.shuffled(rng), k))
+
+
+class ChunkMatchIndex:
+    """
+    compiled compatibility index of a chunk dict, replaces per placement regex matching in ChunkMap
+
+    every (chunk, rotation) pair gets a bit, bit number is chunk position * 4 + rotation. For each side and each
+    match string (boundary, empty space, or a chunk's match string) the index holds an int bitset of the pairs whose
+    connection on that side matches, so finding candidates for a location is an AND of four bitsets. Only a chunk's
+    unique_rotations get bits set, rotations identical to a lower one are never candidates.
+
+    match strings are expected to match a single connection character, like '[zE]' or 'A', the same as all of
+    the chunks in chunk_library
+
+    the index also keeps (n_chunks, 4, size, size) stacks of every chunk's rotated walk and transparency arrays,
+    and of their TILE_ flags, in the same chunk order, so a whole chunk map can be stamped into tiles at once
+    """
+
+    def __init__(self, chunk_dict, match_strings=('A', '[A-Za-z]')):
+        """
+        builds the index from a chunk dict
+        :param chunk_dict: dict of {num:Chunk}
+        :param match_strings: extra match strings to compile up front, defaults are the boundary and empty space
+        """
+        keys = list(chunk_dict.keys())
+        chunks = [chunk_dict[key] for key in keys]
 
+        for key, chunk in zip(keys, chunks):
+            for connection in chunk.connections:
+                if len(connection) != 1:
+                    raise RuntimeError('Connection {} of chunk {} is not a single character'.format(connection, key))
 
+        unique = np.zeros((len(keys), 4), dtype=bool)
+        for position, chunk in enumerate(chunks):
+            unique[position, chunk.unique_rotations] = True
+
+        # rotated tile stacks, indexed [chunk position, rotation]
+        walk_stack = np.array([[chunk.get_rotated_walkable_array(rotation) for rotation in range(4)]
+                               for chunk in chunks], dtype=np.uint8)
+        transparent_stack = np.array([[chunk.get_rotated_transparent_array(rotation) for rotation in range(4)]
+                                      for chunk in chunks], dtype=np.uint8)
+
+        chunk_match_strings = set(match_strings)
+        for chunk in chunks:
+            chunk_match_strings.update(chunk.match_strings)
+
+        self._build(keys, np.array([list(chunk.connections) for chunk in chunks], dtype=str).reshape(-1, 4), unique,
+                    chunk_match_strings, walk_stack, transparent_stack)
+
+    @classmethod
+    def from_arrays(cls, keys, connections, unique, match_strings, walk_stack, transparent_stack):
+        """
+        builds the index straight from library arrays, without making Chunk objects, see ChunkLibraryFile
+        :param keys: list of chunk keys
+        :param connections: (n_chunks, 4) array of single character connections, unrotated
+        :param unique: (n_chunks, 4) bool array, True for each chunk's unique rotations
+        :param match_strings: every match string to compile up front
+        :param walk_stack: (n_chunks, 4, size, size) rotated walk arrays
+        :param transparent_stack: (n_chunks, 4, size, size) rotated transparent arrays
+        :return: ChunkMatchIndex
+        """
+        out = cls.__new__(cls)
+        out._build(keys, connections, unique, match_strings, walk_stack, transparent_stack)
+        return out
+
+    def _build(self, keys, connections, unique, match_strings, walk_stack, transparent_stack):
+        self.keys = list(keys)
+        self.full_mask = (1 << (4 * len(self.keys))) - 1
+
+        # connection on each side of each (chunk, rotation), the same as Chunk.get_connection
+        sides = np.arange(4)
+        rotated = connections[:, (sides[None, :] - sides[:, None]) % 4]
+
+        # bitset of pairs per side, per connection character. equivalent rotations are left out so every
+        # candidate is a distinct variant
+        self.char_masks = [{}, {}, {}, {}]
+        for side in range(4):
+            side_connections = rotated[:, :, side]
+            for connection in np.unique(side_connections):
+                bits = ((side_connections == connection) & unique).ravel()
+                packed = np.packbits(bits, bitorder='little').tobytes()
+                self.char_masks[side][str(connection)] = int.from_bytes(packed, 'little')
+
+        # bitset of pairs per side, per match string, filled in by get_side_mask
+        self.side_masks = [{}, {}, {}, {}]
+        for match_string in match_strings:
+            self._compile(match_string)
+
+        self.walk_stack = walk_stack
+        self.transparent_stack = transparent_stack
+        self.flag_stack = tile_flags_from_layers(walk_stack, transparent_stack)
+
+        # chunk key to chunk position, keys are the numbers stored in ChunkMap.chunk_map
+        self.key_lookup = np.full(int(max(self.keys)) + 1, -1, dtype=np.intp)
+        self.key_lookup[np.array(self.keys, dtype=np.intp)] = np.arange(len(self.keys))
+
+    def get_positions(self, chunk_map):
+        """
+        converts an array of chunk keys into chunk positions in this index
+        :param chunk_map: numpy array of chunk keys, as in ChunkMap.chunk_map
+        :return: int numpy array of the same shape
+        """
+        keys = chunk_map.astype(np.intp)
+        if keys.min() < 0 or keys.max() >= len(self.key_lookup) or (self.key_lookup[keys] < 0).any():
+            raise RuntimeError('chunk map has chunks that are not in the chunk dict')
+        return self.key_lookup[keys]
+
+    def stamp(self, stack, chunk_map, rotation_map):
+        """
+        builds a full tile array from a chunk map in one pass, no loop over chunks
+        :param stack: flag_stack, walk_stack or transparent_stack
+        :param chunk_map: numpy array of chunk keys
+        :param rotation_map: numpy array of rotations
+        :return: numpy array of tiles, chunk_map shape times chunk size
+        """
+        rows, columns = chunk_map.shape
+        size = stack.shape[-1]
+        # (rows, columns, size, size) blocks of tiles, then interleave block rows with tile rows
+        tiles = stack[self.get_positions(chunk_map), rotation_map.astype(np.intp) % 4]
+        return tiles.transpose(0, 2, 1, 3).reshape(rows * size, columns * size)
+
+    def _compile(self, match_string):
+        """
+        compiles a match string into bitsets for all four sides
+        :param match_string: regex matching a single connection character
+        :return: none, updates self.side_masks
+        """
+        search_term = re.compile(match_string)
+        for side in range(4):
+            mask = 0
+            for connection, char_mask in self.char_masks[side].items():
+                if search_term.fullmatch(connection) is not None:
+                    mask |= char_mask
+            self.side_masks[side][match_string] = mask
+
+    def get_side_mask(self, side, match_string):
+        """
+        get bitset of the pairs whose connection on a side matches a match string
+        :param side: side number, 0 based, counterclockwise from top
+        :param match_string: regex matching a single connection character
+        :return: int bitset
+        """
+        try:
+            return self.side_masks[side][match_string]
+        except KeyError:
+            self._compile(match_string)
+            return self.side_masks[side][match_string]
+
+    def choose(self, mask, rng=random):
+        """
+        randomly picks a pair out of a bitset, first a chunk then one of it's matching rotations, the same odds
+        as shuffling the chunks and rotations and taking the first match
+        :param mask: int bitset of candidates
+        :param rng: random module or random.Random instance
+        :return: chunk key, rotation, None, None if mask is empty
+        """
+        if not mask:
+            return None, None
+
+        pairs = self.get_pairs(mask)
+        position = int(rng.choice(self.get_chunk_positions(pairs)))
+        return self.keys[position], int(rng.choice(np.flatnonzero(pairs[position])))
+
+    def get_pairs(self, mask):
+        """
+        unpacks a bitset, without looping over it's bits
+        :param mask: int bitset of candidates
+        :return: (n_chunks, 4) bool numpy array, indexed [chunk position, rotation]
+        """
+        count = 4 * len(self.keys)
+        packed = np.frombuffer(mask.to_bytes((count + 7) // 8, 'little'), dtype=np.uint8)
+        return np.unpackbits(packed, count=count, bitorder='little').view(bool).reshape(-1, 4)
+
+    @staticmethod
+    def get_chunk_positions(pairs):
+        """
+        finds the chunks with any candidate rotation
+        :param pairs: array from get_pairs
+        :return: int numpy array of chunk positions, ascending
+        """
+        # a chunk's four rotations are four bytes in a row, read them as one uint32 per chunk
+        return np.flatnonzero(pairs.view(np.uint32))
+
+    def get_chunk_mask(self, key):
+        """
+        get bitset of every rotation of one chunk
+        :param key: chunk key
+        :return: int bitset, 0 if the chunk is not in the index
+        """
+        if key not in self.keys:
+            return 0
+        return 0b1111 << (self.keys.index(key) * 4)
+
+    def get_candidates(self, mask):
+        """
+        lists the pairs in a bitset
+        :param mask: int bitset of candidates
+        :return: list of (chunk key, rotation)
+        """
+        positions, rotations = np.nonzero(self.get_pairs(mask))
+        return [(self.keys[position], rotation) for position, rotation in zip(positions.tolist(), rotations.tolist())]
+
+
+def library_hash(chunk_dict):
+    """
+    hash of everything in a chunk dict that changes generation, used to key cached levels
+    :param chunk_dict: dict of {num:Chunk}
+    :return: hex string
+    """
+    out = hashlib.sha1()
+    for key in sorted(chunk_dict):
+        chunk = chunk_dict[key]
+        out.update(repr((key, list(chunk.connections), list(chunk.match_strings), chunk.walk_array.shape)).encode())
+        out.update(np.ascontiguousarray(chunk.walk_array, dtype=np.float64).tobytes())
+        out.update(np.ascontiguousarray(chunk.transparent_array, dtype=np.float64).tobytes())
+    return out.hexdigest()
 
 
 def test_chunk_map():
@@ -403,6 +1044,69 @@ class Chunk:
         self.connections = connections
         self.match_strings = match_strings
 
+        # rotation each rotation is identical to, lowest rotation first, and the rotations that are different
+        self.rotation_canonical = self._find_equivalent_rotations()
+        self.unique_rotations = sorted(set(self.rotation_canonical))
+
+        # rotated arrays are made once, read only, and only for unique rotations
+        self._walk_rotations = {}
+        self._transparent_rotations = {}
+        for rotation in self.unique_rotations:
+            self._walk_rotations[rotation] = self._read_only(np.rot90(self.walk_array, rotation))
+            self._transparent_rotations[rotation] = self._read_only(np.rot90(self.transparent_array, rotation))
+
+    @classmethod
+    def from_rotations(cls, walk_rotations, transparent_rotations, connections, match_strings, rotation_canonical):
+        """
+        makes a chunk from already rotated arrays, nothing is copied or recomputed, see ChunkLibraryFile
+        :param walk_rotations: (4, size, size) walk arrays for rotations 0 to 3
+        :param transparent_rotations: (4, size, size) transparent arrays for rotations 0 to 3
+        :param connections: list of 4 connection characters
+        :param match_strings: list of 4 match strings
+        :param rotation_canonical: list of 4, the lowest equivalent rotation for each rotation
+        :return: Chunk
+        """
+        out = cls.__new__(cls)
+        out.walk_array = walk_rotations[0]
+        out.transparent_array = transparent_rotations[0]
+        out.connections = connections
+        out.match_strings = match_strings
+        out.rotation_canonical = list(rotation_canonical)
+        out.unique_rotations = sorted(set(out.rotation_canonical))
+        out._walk_rotations = {rotation: walk_rotations[rotation] for rotation in out.unique_rotations}
+        out._transparent_rotations = {rotation: transparent_rotations[rotation] for rotation in out.unique_rotations}
+        return out
+
+    @staticmethod
+    def _read_only(array):
+        out = np.ascontiguousarray(array)
+        out.setflags(write=False)
+        return out
+
+    def _find_equivalent_rotations(self):
+        """
+        works out which rotations give the same connections, match strings and tiles
+        :return: list of 4, the lowest equivalent rotation for each rotation
+        """
+        out = []
+        for rotation in range(4):
+            canonical = rotation
+            for earlier in range(rotation):
+                if out[earlier] == earlier and self._rotations_equal(earlier, rotation):
+                    canonical = earlier
+                    break
+            out.append(canonical)
+        return out
+
+    def _rotations_equal(self, first, second):
+        for side in range(4):
+            if self.get_connection(side, first) != self.get_connection(side, second):
+                return False
+            if self.get_match_string(side, first) != self.get_match_string(side, second):
+                return False
+        return (np.array_equal(np.rot90(self.walk_array, first), np.rot90(self.walk_array, second)) and
+                np.array_equal(np.rot90(self.transparent_array, first), np.rot90(self.transparent_array, second)))
+
     def get_connection(self, side, rotation):
         """
         get connection based on rotation and absolute side wanted
@@ -424,10 +1128,10 @@ class Chunk:
     def get_rotation_connections(self):
         """
         gets a dictionary of side, and match string
-        :return: dictionary of match strings, based on rotation
+        :return: dictionary of match strings, based on rotation, only unique rotations are included
         """
         out = {}
-        for rotation in range(4): # number of rotations is locked, due to 2d limitations
+        for rotation in self.unique_rotations: # number of rotations is locked, due to 2d limitations
             #go through all sides, creating a full match string for each rotation, each match starting at the top
             out[rotation] = ''
             for side in range(4):
@@ -437,19 +1141,21 @@ class Chunk:
 
 
 
-    # TODO make sure to add rotation commands for the numpy arrays
-
     def get_rotated_walkable_array(self,rotation):
-        out = self.walk_array
-        for i in range(int(rotation)):
-            out = np.rot90(out)
-        return out
+        """
+        get walk array rotated, arrays are cached and read only
+        :param rotation: rotation of 90 degrees, counterclockwise
+        :return: numpy array
+        """
+        return self._walk_rotations[self.rotation_canonical[int(rotation) % 4]]
 
     def get_rotated_transparent_array(self, rotation):
-        out = self.transparent_array
-        for i in range(int(rotation)):
-            out = np.rot90(out)
-        return out
+        """
+        get transparent array rotated, arrays are cached and read only
+        :param rotation: rotation of 90 degrees, counterclockwise
+        :return: numpy array
+        """
+        return self._transparent_rotations[self.rotation_canonical[int(rotation) % 4]]
 
 
 
@@ -1,5 +1,6 @@
-import tdl
 import PuzzleGenerator as pg
+import FrameBuffer as fb
+import Backends
 
 COLOR_BLACK = (0,0,0)
 COLOR_WHITE = (255,255,255)
@@ -8,38 +9,41 @@ WIDTH = 50
 HEIGHT = 50
 
 
-def create_consoles():
-    # create console
-    console = tdl.init(WIDTH, HEIGHT, title='Room View')
-
-    # create next console in cycle
-    next_console = tdl.Console(WIDTH, HEIGHT)
-    #comment is comment
-
-    return console, next_console
-
-
-if __name__ == '__main__':
-    console, next_console = create_consoles()
+def run_preview(backend, seed=None):
+    """
+    show a new walk map for every key press until the window is closed or a QUIT event
+    :param backend: Backends.TdlBackend, Backends.HeadlessBackend or anything like them
+    :param seed: seed of the first map, maps after it use the next seeds, None for unseeded maps
+    :return: number of maps shown
+    """
+    console, next_console = backend.create_consoles()
 
     cks = pg.chunk_library()
+    match_index = pg.ChunkMatchIndex(cks)
+    frame = fb.Frame(WIDTH, HEIGHT)
+    shown = 0
 
-    while not tdl.event.is_window_closed():
-        world = pg.ChunkMap(WIDTH,HEIGHT,5,cks)
+    while not backend.is_closed():
+        world = pg.ChunkMap(WIDTH,HEIGHT,5,cks,match_index,seed=None if seed is None else seed + shown)
         world.generate(50,200)
         world.place_tiles_from_chunk_map()
 
-        for i in range(HEIGHT):
-            for j in range(WIDTH):
-                next_console.draw_char(j,i,' ',bg=COLOR_DICT[world.tile_map_walkable[(i,j)]])
+        # walk map rows are console rows
+        fb.compose_tiles(frame, world.tile_map_walkable.T, COLOR_DICT)
+        fb.upload(next_console, frame)
 
-        console.blit(next_console,width=WIDTH,height=HEIGHT)
+        backend.present(console, next_console)
+        shown += 1
 
-        tdl.flush()
-
-        event = tdl.event.key_wait()
+        event = backend.wait_for_event()
 
         if event:
             # print(event)
             if event.type == 'QUIT':
-                raise SystemExit()
+                break
+
+    return shown
+
+
+if __name__ == '__main__':
+    run_preview(Backends.TdlBackend(WIDTH, HEIGHT))
@@ -1,60 +1,294 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
+import threading
+
 from tdl.map import Map
 import numpy as np
 import random
 
+import PuzzleGenerator as pg
+import MapAnalysis as ma
+import FieldOfView as fv
+import ChunkGraph as cg
+
 class WorldMap:
 
-    def __init__(self,width, height):
+    def __init__(self,width, height, seed=None):
         self.tdl_map = Map(width, height)
-        self.explored = set()  # list of all points that the player has seen
+        self.random = random.Random(seed)  # random stream for placing things on this map
+        self.explored = np.zeros(self.tdl_map.walkable.shape, dtype=bool)  # points that the player has seen
         self.up_stairs = None
         self.down_stairs = None
-        self.pieces = []
+        self.pieces = {}  # every piece on the map in the order they were added, dict keys so removing is O(1)
+        self.piece_locations = {}  # (x,y): list of the pieces at that point
+        self.walk_index = None  # Frontier of walkable points, built when first needed
+        self.components = None  # MapAnalysis.ComponentMap of walkable areas, built when first needed
+        self.stairs_distance = None  # steps from the up stairs to every point, set by set_stairs
+        self.map_version = 0  # goes up every time walkable or transparent tiles change
+        self.view_cache = OrderedDict()  # (point, radius, fov, light_walls): tuple of points, oldest used first
+        self.view_cache_size = 1024
+        self.view_table = None  # ViewTable from precompute_views
+        self.fov_lock = threading.Lock()  # the tdl map is shared with the precompute thread
+        self.path_cache = OrderedDict()  # (start, end): tuple of path points, oldest used first
+        self.path_cache_size = 4096
+        self.flow_fields = OrderedDict()  # frozenset of targets: MapAnalysis.FlowField, oldest used first
+        self.flow_field_cache_size = 16
+        self.chunk_layout = None  # (chunk size, chunk map, rotation map) the tiles were stamped from
+        self.chunk_graph = None  # ChunkGraph.ChunkGraph, built when first needed
 
     def load_walk_map(self, walk_map):
         """
-        loads walk map from a generator into the tdl map
-        :param walk_map: numpy array of values
+        loads walk map from a generator into the tdl map, in one copy into the map's walkable buffer
+        :param walk_map: numpy array of values indexed [x, y] like points, nonzero is walkable, ChunkMap layers are
+        (height, width) so go in transposed
         :return: none, updates self.tdl_map
         """
-        # get shape of walk_map
-        height, width = np.shape(walk_map)
-
-        for i in range(height):
-            for j in range(width):
-                self.tdl_map.walkable[i,j] = bool(walk_map[(i,j)])
+        np.not_equal(self._check_shape(walk_map, 'walk map'), 0, out=self.tdl_map.walkable)
+        self.walk_index = None
+        self.components = None
+        self.path_cache.clear()
+        self.flow_fields.clear()
+        self.chunk_graph = None
+        self._map_changed()
 
     def load_transparent_map(self, transparent_map):
         """
-        loads transparency map from a generator into the tdl map
-        :param transparent_map: numpy array of values
+        loads transparency map from a generator into the tdl map, in one copy into the map's transparent buffer
+        :param transparent_map: numpy array of values indexed [x, y] like points, nonzero is transparent, ChunkMap
+        layers are (height, width) so go in transposed
         :return: none, updates self.tdl_map
         """
-        # get shape of walk_map
-        height, width = np.shape(transparent_map)
+        np.not_equal(self._check_shape(transparent_map, 'transparent map'), 0, out=self.tdl_map.transparent)
+        self._map_changed()
+
+    def load_chunk_map(self, chunk_map, rotation_map):
+        """
+        keep the chunk map the tiles were stamped from, for get_chunk_path
+        :param chunk_map: numpy array of chunk keys indexed [x, y] like points, ChunkMap.chunk_map transposed
+        :param rotation_map: numpy array of chunk rotations, ChunkMap.rotation_map transposed
+        :return: none, updates self.chunk_layout
+        """
+        rows, columns = np.shape(chunk_map)
+        chunk_size = self.explored.shape[0] // max(rows, 1)
+        if (rows * chunk_size, columns * chunk_size) != self.explored.shape:
+            raise RuntimeError('chunk map shape {} does not fit map shape {}'.format(np.shape(chunk_map),
+                                                                                    self.explored.shape))
+        self.chunk_layout = (chunk_size, chunk_map, rotation_map)
+        self.chunk_graph = None
+
+    def _map_changed(self):
+        """
+        drop everything worked out from the old tiles, a running precompute sees the new version and stops
+        """
+        self.map_version += 1
+        self.view_cache.clear()
+        self.view_table = None
 
-        for i in range(height):
-            for j in range(width):
-                self.tdl_map.transparent[i,j] = bool(transparent_map[(i,j)])
+    def _check_shape(self, array, name):
+        """
+        check a generator array matches the tdl map before loading it
+        :param array: array like of values
+        :param name: name of the array for the error
+        :return: array as a numpy array
+        """
+        array = np.asarray(array)
+        if array.shape != self.tdl_map.walkable.shape:
+            raise RuntimeError('{} shape {} does not match map shape {}'.format(name, array.shape,
+                                                                               self.tdl_map.walkable.shape))
+        return array
 
-    def get_view(self,point, radius):
+    def get_view(self,point, radius, fov='DIAMOND', light_walls=False):
         """
-        gets a list of all points that can be seen from this location on the world map
+        gets all points that can be seen from this location on the world map, repeated calls are answered from
+        an LRU cache or the precomputed view table until the map changes
         :param point: point to start search
-        :return: iterable of points that can be seen
+        :param radius: how far can be seen
+        :param fov: tdl fov algorithm
+        :param light_walls: include the walls at the edge of the view
+        :return: tuple of points that can be seen, shared with the cache so do not change it
         """
-        viewable = list(self.tdl_map.compute_fov(point[0],point[1],radius=radius,light_walls=False,fov='DIAMOND'))
-        # print(viewable)
+        key = ((int(point[0]), int(point[1])), radius, fov, light_walls)
+        viewable = self.view_cache.get(key)
+        if viewable is not None:
+            self.view_cache.move_to_end(key)
+            return viewable
+
+        table = self.view_table
+        if table is not None and table.settings == key[1:]:
+            viewable = table.get_view(key[0])
+        if viewable is None:
+            viewable = self._compute_view(key[0], radius, fov, light_walls)
+
+        self.view_cache[key] = viewable
+        if len(self.view_cache) > self.view_cache_size:
+            self.view_cache.popitem(last=False)
         return viewable
 
+    def _compute_view(self, point, radius, fov, light_walls):
+        with self.fov_lock:
+            return tuple(self.tdl_map.compute_fov(point[0],point[1],radius=radius,light_walls=light_walls,fov=fov))
+
+    def precompute_views(self, radius, fov='DIAMOND', light_walls=False, background=True):
+        """
+        work out the view from every walkable point and keep them in a ViewTable, so get_view with the same
+        settings never runs fov again. Points are looked up as soon as they are done, the table is thrown away if
+        the map changes
+        :param radius: how far can be seen
+        :param fov: tdl fov algorithm
+        :param light_walls: include the walls at the edge of the view
+        :param background: work in a daemon thread instead of waiting for every point
+        :return: the thread if background, else none
+        """
+        table = ViewTable(self.explored.shape, radius, fov, light_walls)
+        self.view_table = table
+        version = self.map_version
+        points = list(self.get_walk_index())
+
+        def run():
+            for point in points:
+                view = self._compute_view(point, radius, fov, light_walls)
+                if self.map_version != version:
+                    return
+                table.set_view(point, view)
+            table.complete = True
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name='precompute_views', daemon=True)
+        thread.start()
+        return thread
+
+    def get_views(self, points, radii, fov='DIAMOND', light_walls=False):
+        """
+        gets the views of many viewers at once from the transparent layer, the same points get_view gives but
+        worked out with numpy instead of tdl's fov
+        :param points: list or (n, 2) array of (x,y) viewer points
+        :param radii: how far each viewer can see, one number for all of them or one per viewer
+        :param fov: fov algorithm, only 'DIAMOND'
+        :param light_walls: include the walls at the edge of the view
+        :return: bool numpy array (n, side, side) of windows centred on each viewer, see FieldOfView
+        """
+        return fv.compute_views(self.tdl_map.transparent, points, radii, fov, light_walls)
+
     def get_path(self,start_point,end_point):
         """
-        calculate path from start point to end point
+        calculate path from start point to end point, repeated calls are answered from an LRU cache until the walk
+        map changes
         :param start_point: (x,y)
         :param end_point: (x,y)
         :return: list of tuples of shortest path
         """
-        return self.tdl_map.compute_path(start_point[0],start_point[1],end_point[0],end_point[1])
+        key = (self._as_point(start_point), self._as_point(end_point))
+        path = self.path_cache.get(key)
+        if path is not None:
+            self.path_cache.move_to_end(key)
+            return list(path)
+
+        path = self.tdl_map.compute_path(start_point[0],start_point[1],end_point[0],end_point[1])
+        self._cache_path(key, path)
+        return list(path)
+
+    def _cache_path(self, key, path):
+        self.path_cache[key] = tuple(map(tuple, path))
+        if len(self.path_cache) > self.path_cache_size:
+            self.path_cache.popitem(last=False)
+
+    def get_chunk_graph(self):
+        """
+        gets the graph of entrances between chunks, built the first time it is needed after the walk map changes
+        :return: ChunkGraph.ChunkGraph
+        """
+        if self.chunk_layout is None:
+            raise RuntimeError('no chunk map loaded, see load_chunk_map')
+        if self.chunk_graph is None:
+            self.chunk_graph = cg.ChunkGraph(self.tdl_map.walkable, *self.chunk_layout)
+        return self.chunk_graph
+
+    def get_chunk_path(self, start_point, end_point):
+        """
+        calculate a path over the chunk graph, far cheaper than get_path across a big map but can be a few steps
+        longer
+        :param start_point: (x,y)
+        :param end_point: (x,y)
+        :return: list of tuples of the path
+        """
+        return self.get_chunk_graph().get_path(start_point, end_point)
+
+    def get_paths(self, pairs, workers=None, processes=False):
+        """
+        calculate many paths at once, the ones not in the cache are split between the workers of a pool, each
+        with it's own copy of the walk map
+        :param pairs: list of (start_point, end_point)
+        :param workers: number of workers, None for one per core, 1 works in this thread
+        :param processes: use a process pool instead of threads
+        :return: list of paths, one for each pair in the same order
+        """
+        keys = [(self._as_point(start), self._as_point(end)) for start, end in pairs]
+        out = [None] * len(keys)
+        missing = {}  # key: positions in out
+        for i, key in enumerate(keys):
+            path = self.path_cache.get(key)
+            if path is not None:
+                self.path_cache.move_to_end(key)
+                out[i] = list(path)
+            else:
+                missing.setdefault(key, []).append(i)
+
+        todo = list(missing)
+        workers = min(workers or os.cpu_count() or 1, len(todo))
+        if workers <= 1:
+            paths = [self.tdl_map.compute_path(start[0], start[1], end[0], end[1]) for start, end in todo]
+        else:
+            # one batch per worker, the walk map is copied once per batch
+            walkable = self.tdl_map.walkable.copy()
+            batches = [todo[i::workers] for i in range(workers)]
+            executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+            with executor(max_workers=workers) as pool:
+                results = list(pool.map(compute_paths, [walkable] * workers, batches))
+            paths = [None] * len(todo)
+            for i, result in enumerate(results):
+                paths[i::workers] = result
+
+        for key, path in zip(todo, paths):
+            self._cache_path(key, path)
+            for i in missing[key]:
+                out[i] = list(path)
+        return out
+
+    def get_flow_field(self, targets):
+        """
+        gets the steps from every walkable point to the nearest target, kept until the walk map changes. A field
+        for one target is worked out from a kept field of a nearby single target when there is one, so following
+        a moving player is cheap
+        :param targets: list of (x,y) points
+        :return: MapAnalysis.FlowField, shared with the cache so do not change it
+        """
+        key = frozenset(map(self._as_point, targets))
+        field = self.flow_fields.get(key)
+        if field is not None:
+            self.flow_fields.move_to_end(key)
+            return field
+
+        if len(key) == 1:
+            target = next(iter(key))
+            # kept single target field with the target the fewest steps away
+            nearest = None
+            for other in self.flow_fields.values():
+                if len(other.targets) == 1:
+                    steps = other.get_distance(target)
+                    if steps >= 0 and (nearest is None or steps < nearest[0]):
+                        nearest = (steps, other)
+            if nearest is not None:
+                field = nearest[1].move_target(target)
+        if field is None:
+            field = ma.FlowField(self.tdl_map.walkable, key)
+
+        self.flow_fields[key] = field
+        if len(self.flow_fields) > self.flow_field_cache_size:
+            self.flow_fields.popitem(last=False)
+        return field
 
     def has_been_explored(self,point):
         """
@@ -62,16 +296,48 @@ class WorldMap:
         :param point: tuple (x,y)
         :return: True or false
         """
-        return point in self.explored
+        if not (0 <= point[0] < self.explored.shape[0] and 0 <= point[1] < self.explored.shape[1]):
+            return False
+        return bool(self.explored[point[0],point[1]])
 
     def add_to_explored(self,points):
         """
-        adds list of points to self.explored list
-        :param points: list of tuples to append to explored
-        :return: none, updates self.explored
+        marks points as explored
+        :param points: list of (x,y) tuples, like get_view gives, or a bool numpy array the shape of the map
+        :return: numpy array of (x,y) rows of the points that were not explored before
         """
-        for point in points:
-            self.explored.add(point)
+        if isinstance(points, np.ndarray) and points.dtype == bool:
+            new_points = np.argwhere(points & ~self.explored)
+        else:
+            points = self._as_point_array(points)
+            new_points = points[~self.explored[points[:,0],points[:,1]]]
+        self.explored[new_points[:,0],new_points[:,1]] = True
+        return new_points
+
+    def get_view_mask(self, points):
+        """
+        turn a list of points, like get_view gives, into a mask
+        :param points: list of (x,y) tuples
+        :return: bool numpy array the shape of the map
+        """
+        out = np.zeros(self.explored.shape, dtype=bool)
+        points = self._as_point_array(points)
+        out[points[:,0],points[:,1]] = True
+        return out
+
+    def get_remembered_mask(self, view):
+        """
+        get the points that have been explored but can not be seen now
+        :param view: list of (x,y) tuples or bool numpy array of the points that can be seen
+        :return: bool numpy array the shape of the map
+        """
+        if not (isinstance(view, np.ndarray) and view.dtype == bool):
+            view = self.get_view_mask(view)
+        return self.explored & ~view
+
+    @staticmethod
+    def _as_point_array(points):
+        return np.asarray(list(points), dtype=np.intp).reshape(-1, 2)
 
     def collides_with_map(self,point):
         """
@@ -82,54 +348,262 @@ class WorldMap:
 
         return not self.tdl_map.walkable[point[0],point[1]]
 
+    def set_walkable(self, point, walkable=True):
+        """
+        change if a single point is walkable, keeping the walk index up to date
+        :param point: (x,y) tuple
+        :param walkable: True or false
+        :return: none, updates self.tdl_map
+        """
+        self.tdl_map.walkable[point[0], point[1]] = walkable
+        self.components = None
+        if self.chunk_layout is not None:
+            # tiles no longer match the chunks they were stamped from, chunks are told apart by their tiles
+            self.chunk_layout = (self.chunk_layout[0], None, None)
+        self.path_cache.clear()
+        self.flow_fields.clear()
+        self.chunk_graph = None
+        self._map_changed()
+        if self.walk_index is not None:
+            point = (int(point[0]), int(point[1]))
+            if walkable:
+                self.walk_index.add(point)
+            else:
+                self.walk_index.discard(point)
+
+    def set_transparent(self, point, transparent=True):
+        """
+        change if a single point can be seen through, dropping cached views
+        :param point: (x,y) tuple
+        :param transparent: True or false
+        :return: none, updates self.tdl_map
+        """
+        self.tdl_map.transparent[point[0], point[1]] = transparent
+        self._map_changed()
+
+    def get_walk_index(self):
+        """
+        gets the index of walkable points, built from the walkable array the first time it is needed after
+        loading a walk map
+        :return: PuzzleGenerator.Frontier of (x,y) tuples, do not change it directly, use set_walkable
+        """
+        if self.walk_index is None:
+            points = np.argwhere(self.tdl_map.walkable).tolist()
+            self.walk_index = pg.Frontier(map(tuple, points))
+        return self.walk_index
+
     def get_available_walk_spaces(self):
         """
         returns list of all points available to put something walkable (pieces)
         :return: list of tuples
         """
-        out = []
-        for i in range(self.tdl_map.height):
-            for j in range(self.tdl_map.width):
-                if self.tdl_map.walkable[i,j]:
-                    out.append((i,j))
-        return out
+        return list(self.get_walk_index())
 
-    def set_stairs(self,place_down=True,retries=5):
+    def sample_walk_spaces(self, k, rng=None):
         """
-        place up and down stairs
+        pick k distinct walkable points in O(k)
+        :param k: number of points
+        :param rng: random.Random instance, None for self.random
+        :return: list of tuples, all walkable points if there are fewer than k
+        """
+        return self.get_walk_index().sample(k, rng or self.random)
+
+    def get_components(self):
+        """
+        gets the connected walkable areas of the map, found the first time they are needed after the walk map
+        changes
+        :return: MapAnalysis.ComponentMap
+        """
+        if self.components is None:
+            self.components = ma.ComponentMap(self.tdl_map.walkable)
+        return self.components
+
+    def set_stairs(self,place_down=True,min_distance=0):
+        """
+        place up and down stairs, both in the largest walkable area so the down stairs can always be reached
         :param place_down: places stairs further down, false for final level
-        :return: none, updates self.stair positions
-        """
-        # loop to make sure it is possible to reach the end
-        locations = self.get_available_walk_spaces()
-        complete = False
-        while not complete:
-            # place start randomly
-            self.up_stairs = random.choice(locations)
-            del locations[locations.index(self.up_stairs)]
-            pathable = False
-            iterations = 0
-            if place_down:
-                while (not pathable) and (iterations < retries) :
-                    self.down_stairs = random.choice(locations)
-                    del locations[locations.index(self.down_stairs)]
-                    # check if possible to reach
-                    if self.get_path(self.up_stairs,self.down_stairs):
-                        pathable = True
-            else:
-                pathable = True
+        :param min_distance: fewest steps from the up stairs to the down stairs, if no point is that far the
+        farthest point is used
+        :return: none, updates self.stair positions and self.stairs_distance
+        """
+        components = self.get_components()
+        label = components.largest
+        if label is None:
+            raise RuntimeError('no walkable points to place stairs')
+
+        # place start randomly in the largest area
+        locations = np.argwhere(components.get_mask(label))
+        self.up_stairs = tuple(locations[self.random.randrange(len(locations))].tolist())
+        # steps from the start to every point, only points in it's area are reachable
+        self.stairs_distance = ma.bfs_distance(self.tdl_map.walkable, [self.up_stairs])
 
-            if pathable:
-                complete = True
+        if place_down:
+            locations = np.argwhere(self.stairs_distance >= max(min_distance, 1))
+            if not len(locations):
+                farthest = self.stairs_distance.max()
+                if farthest == 0:
+                    raise RuntimeError('largest walkable area is a single point, no room for down stairs')
+                locations = np.argwhere(self.stairs_distance == farthest)
+            self.down_stairs = tuple(locations[self.random.randrange(len(locations))].tolist())
 
     def add_piece(self,piece):
-        self.pieces.append(piece)
+        """
+        put a piece on the map, indexed at it's location
+        :param piece: GamePiece.Piece
+        :return: none
+        """
+        self.pieces[piece] = None
+        self.piece_locations.setdefault(self._as_point(piece.location), []).append(piece)
+
+    def remove_piece(self,piece, location=None):
+        """
+        take a piece off the map
+        :param piece: GamePiece.Piece
+        :param location: (x,y) the piece is indexed at, None for it's location
+        :return: none
+        """
+        if piece not in self.pieces:
+            raise ValueError('piece is not on this map')
+        del self.pieces[piece]
+        self._unindex_piece(piece, piece.location if location is None else location)
+
+    def move_piece(self, piece, old_location):
+        """
+        keep the index up to date after a piece on this map moved, called by Piece.move_piece_to
+        :param piece: GamePiece.Piece, already at it's new location
+        :param old_location: (x,y) the piece moved from
+        :return: none
+        """
+        self._unindex_piece(piece, old_location)
+        self.piece_locations.setdefault(self._as_point(piece.location), []).append(piece)
+
+    def _unindex_piece(self, piece, location):
+        location = self._as_point(location)
+        here = self.piece_locations[location]
+        here.remove(piece)
+        if not here:
+            del self.piece_locations[location]
+
+    def get_pieces_at(self, point):
+        """
+        gets the pieces at a point
+        :param point: (x,y) tuple
+        :return: list of pieces, a copy so pieces can be removed while going through it
+        """
+        return list(self.piece_locations.get(self._as_point(point), ()))
+
+    def get_pieces_in_rect(self, x, y, width, height):
+        """
+        gets the pieces inside a rectangle, looking at whichever is smaller of the rectangle or the occupied points
+        :param x: left edge
+        :param y: top edge
+        :param width: width of the rectangle
+        :param height: height of the rectangle
+        :return: list of pieces
+        """
+        out = []
+        if width * height < len(self.piece_locations):
+            for i in range(x, x + width):
+                for j in range(y, y + height):
+                    out.extend(self.piece_locations.get((i, j), ()))
+        else:
+            for location, pieces in self.piece_locations.items():
+                if x <= location[0] < x + width and y <= location[1] < y + height:
+                    out.extend(pieces)
+        return out
 
-    def remove_piece(self,piece):
-        self.pieces.remove(piece)
+    def get_pieces_in_view(self, view):
+        """
+        gets the pieces that can be seen
+        :param view: list of (x,y) tuples like get_view gives, or a bool numpy array the shape of the map
+        :return: list of pieces
+        """
+        out = []
+        if isinstance(view, np.ndarray) and view.dtype == bool:
+            for location, pieces in self.piece_locations.items():
+                if view[location[0], location[1]]:
+                    out.extend(pieces)
+        elif len(view) < len(self.piece_locations):
+            for point in view:
+                out.extend(self.piece_locations.get(self._as_point(point), ()))
+        else:
+            view = set(map(self._as_point, view))
+            for location, pieces in self.piece_locations.items():
+                if location in view:
+                    out.extend(pieces)
+        return out
 
+    @staticmethod
+    def _as_point(point):
+        return int(point[0]), int(point[1])
 
 
+def compute_paths(walkable, pairs):
+    """
+    calculate paths on a walk map, the worker of WorldMap.get_paths
+    :param walkable: 2d bool numpy array indexed [x, y]
+    :param pairs: list of (start_point, end_point)
+    :return: list of paths, lists of (x,y) tuples
+    """
+    tdl_map = Map(*walkable.shape)
+    tdl_map.walkable[:] = walkable
+    return [tdl_map.compute_path(start[0], start[1], end[0], end[1]) for start, end in pairs]
 
 
+class ViewTable:
+    """
+    the views from every walkable point of a map for one fov setting
+
+    each view fits in the square of side 2 * radius + 1 around it's point, so it is kept as one bit packed row of
+    that square
+    """
+    def __init__(self, shape, radius, fov, light_walls):
+        """
+        :param shape: shape of the map
+        :param radius: how far can be seen
+        :param fov: tdl fov algorithm
+        :param light_walls: include the walls at the edge of the view
+        """
+        self.settings = (radius, fov, light_walls)
+        self.radius = radius
+        self.side = 2 * radius + 1
+        self.shape = shape
+        self.rows = np.full(shape, -1, dtype=np.int32)  # row in self.bits of every point, -1 if not done
+        self.bits = np.zeros((0, -(-self.side * self.side // 8)), dtype=np.uint8)
+        self.count = 0
+        self.complete = False
+
+    def set_view(self, point, view):
+        """
+        store the view from a point
+        :param point: (x,y) tuple
+        :param view: iterable of (x,y) points that can be seen from it
+        :return: none
+        """
+        window = np.zeros((self.side, self.side), dtype=bool)
+        offsets = np.asarray(list(view), dtype=np.intp).reshape(-1, 2) - point + self.radius
+        window[offsets[:,0], offsets[:,1]] = True
+        if self.count == len(self.bits):
+            # grow by doubling
+            self.bits = np.concatenate([self.bits, np.zeros((max(self.count, 64), self.bits.shape[1]), np.uint8)])
+        self.bits[self.count] = np.packbits(window)
+        self.rows[point[0], point[1]] = self.count
+        self.count += 1
+
+    def get_view(self, point):
+        """
+        :param point: (x,y) tuple
+        :return: tuple of points that can be seen, None if the point has not been done
+        """
+        if not (0 <= point[0] < self.shape[0] and 0 <= point[1] < self.shape[1]):
+            return None
+        row = self.rows[point[0], point[1]]
+        if row < 0:
+            return None
+        window = np.unpackbits(self.bits[row], count=self.side * self.side).reshape(self.side, self.side)
+        points = np.argwhere(window) + (point[0] - self.radius, point[1] - self.radius)
+        return tuple(map(tuple, points.tolist()))
 
+    @property
+    def nbytes(self):
+        return self.rows.nbytes + self.count * self.bits.shape[1]
@@ -17,6 +17,8 @@ class DungeonMap(Map):
         super().__init__(width, height)
         # create dictionary that will hold pieces
         self.pieces = {}
+        # location of every piece, (location_x, location_y): piece id, so checking a tile does not look at every piece
+        self.piece_locations = {}
         # create next id for pieces, will iterate every time a piece is added
         self.next_id = 0
 
@@ -36,6 +38,7 @@ class DungeonMap(Map):
         if self.can_move_here(piece.location_y,piece.location_x) is None:
             # add piece to dictionary
             self.pieces[self.next_id] = piece
+            self.piece_locations[(piece.location_x, piece.location_y)] = self.next_id
 
             # increment id for next piece to be put in
             self.next_id += 1
@@ -44,29 +47,24 @@ class DungeonMap(Map):
 
     def load_from_generator(self, walk_array, transparency_array, override_array ):
         """
-        does nothing right now, but will take data from a generator and set up a map
+        takes data from a generator and sets up the map, arrays are copied in bulk
         :param walk_array: 2d array of walkability
         :param transparency_array: 2d array of transparency
         :return: nothing returned
         """
-        # check that lengths match
-        if len(walk_array[0]) == self.width and len(walk_array) == self.height:
-            # load array into walkable array
-            for y_val in range(self.height):
-                for x_val in range(self.width):
-                    self.walkable[y_val, x_val] = walk_array[y_val][x_val]
-        else:
-            raise Exception('walk array did not match lengths')
+        walk_array = np.asarray(walk_array)
+        transparency_array = np.asarray(transparency_array)
 
-        # check that lengths match
-        if len(transparency_array[0]) == self.width and len(transparency_array) == self.height:
-            # load array into transparent array
-            for y_val in range(self.height):
-                for x_val in range(self.width):
-                    self.transparent[y_val, x_val] = transparency_array[y_val][x_val]
-        else:
+        # check that shapes match before loading anything
+        if walk_array.shape != self.walkable.shape:
+            raise Exception('walk array did not match lengths')
+        if transparency_array.shape != self.transparent.shape:
             raise Exception('transparency array did not match lengths')
 
+        # load arrays into walkable and transparent arrays, one copy each
+        np.not_equal(walk_array, 0, out=self.walkable)
+        np.not_equal(transparency_array, 0, out=self.transparent)
+
     def can_move_here(self, x, y):
         """
         check if there is a tile or piece blocking the way
@@ -76,14 +74,24 @@ class DungeonMap(Map):
         """
         if not self.walkable[y, x]:
             return 'tile'
-        else:
-            for p_id in self.pieces.keys():
-                # check if the pieces location matches y,x location
-                if self.pieces[p_id].location_y == y and self.pieces[p_id].location_x == x:
-                    return p_id
 
-        # if nothing returned, means area is clear to move
-        return None
+        # piece id at the location, None means area is clear to move
+        return self.piece_locations.get((x, y))
+
+    def move_piece(self, piece, old_x, old_y):
+        """
+        keep the piece locations up to date after a piece moved, called by Piece.move
+        :param piece: Piece object, already at it's new location
+        :param old_x: x position the piece moved from
+        :param old_y: y position the piece moved from
+        :return: nothing returned
+        """
+        p_id = self.piece_locations.get((old_x, old_y))
+        if p_id is None or self.pieces[p_id] is not piece:
+            # piece was never added to this map
+            return
+        del self.piece_locations[(old_x, old_y)]
+        self.piece_locations[(piece.location_x, piece.location_y)] = p_id
 
     def can_override(self, x, y):
         """
@@ -164,8 +172,10 @@ class Piece:
             self.parent_map.walkable[self.location_y, self.location_x] = self.tile_under_walkable
             self.parent_map.transparent[self.location_y, self.location_x] = self.tile_under_transparent
             # move piece to new location
+            old_y, old_x = self.location_y, self.location_x
             self.location_y = new_y
             self.location_x = new_x
+            self.parent_map.move_piece(self, old_x, old_y)
             # get tile information to save for later
             self.tile_under_walkable = self.parent_map.walkable[self.location_y, self.location_x]
             self.tile_under_transparent = self.parent_map.transparent[self.location_y, self.location_x]
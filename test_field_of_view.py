@@ -0,0 +1,52 @@
+"""
+FieldOfView gives the same views as tdl's diamond fov
+"""
+import numpy as np
+import pytest
+
+import FieldOfView as fv
+
+
+def test_open_room():
+    transparent = np.ones((21, 21), dtype=bool)
+    windows = fv.compute_views(transparent, [(10, 10), (3, 4)], 5)
+    offsets = np.arange(-5, 6)
+    circle = offsets[:, None] ** 2 + offsets[None, :] ** 2 <= 25
+    np.testing.assert_array_equal(windows[0], circle)
+
+    # off the map is never seen
+    mask = fv.window_to_mask(windows[1], (3, 4), transparent.shape)
+    np.testing.assert_array_equal(mask, fv.window_to_mask(circle, (3, 4), transparent.shape))
+    assert set(fv.window_to_points(windows[1], (3, 4))) == set(map(tuple, np.argwhere(mask).tolist()))
+
+
+def test_wall_casts_shadow():
+    transparent = np.ones((21, 21), dtype=bool)
+    transparent[12, 8:13] = False
+    window = fv.compute_views(transparent, [(10, 10)], 6)[0]
+    mask = fv.window_to_mask(window, (10, 10), transparent.shape)
+    assert not mask[14, 10] and not mask[15, 10]
+    assert not mask[12, 10]
+    lit = fv.window_to_mask(fv.compute_views(transparent, [(10, 10)], 6, light_walls=True)[0], (10, 10),
+                            transparent.shape)
+    assert lit[12, 10] and not lit[14, 10]
+    assert (lit | ~mask).all()
+
+
+def test_radii_per_viewer():
+    transparent = np.ones((30, 30), dtype=bool)
+    windows = fv.compute_views(transparent, [(10, 10), (20, 20)], [3, 6])
+    assert windows.shape == (2, 13, 13)
+    assert windows[0].sum() == fv.compute_views(transparent, [(10, 10)], 3)[0].sum()
+
+
+def test_matches_tdl():
+    pytest.importorskip('tdl.map')
+    import LevelGenerator as lg
+
+    dungeon = lg.build_world_map(lg.generate_level(3, 50, 50))
+    points = [tuple(point) for point in np.argwhere(dungeon.tdl_map.walkable).tolist()][::7]
+    for light_walls in (False, True):
+        windows = dungeon.get_views(points, 5, light_walls=light_walls)
+        for point, window in zip(points, windows):
+            assert set(fv.window_to_points(window, point)) == set(dungeon.get_view(point, 5, light_walls=light_walls))
@@ -0,0 +1,57 @@
+"""
+FrameRenderer draws the same consoles as a full redraw, while walking and when the level changes
+"""
+import pytest
+
+pytest.importorskip('tdl.map')
+
+import numpy as np
+
+import BasicEngine
+import Backends
+import GamePiece as gp
+import LevelGenerator as lg
+
+SIZE = 50
+
+
+def make_level(seed):
+    return lg.build_world_map(lg.generate_level(seed, SIZE, SIZE))
+
+
+def full_redraw(level, player, view):
+    console = Backends.HeadlessConsole(SIZE, SIZE)
+    BasicEngine.draw_frame(console, level, player, view)
+    return console
+
+
+def assert_same(console, expected):
+    for name, array in expected.to_arrays().items():
+        np.testing.assert_array_equal(getattr(console, name), array, err_msg=name)
+
+
+def test_walking_matches_full_redraw():
+    level = make_level(1)
+    player = gp.Piece(level, level.up_stairs, char='@')
+    console = Backends.HeadlessConsole(SIZE, SIZE)
+    renderer = BasicEngine.FrameRenderer(console)
+    path = level.get_path(level.up_stairs, level.down_stairs)[:30]
+    assert path
+    for point in [level.up_stairs] + path:
+        player.move_piece_to(point)
+        view = level.get_view(player.location, 5)
+        level.add_to_explored(view)
+        renderer.draw(level, player, view)
+        assert_same(console, full_redraw(level, player, view))
+
+
+def test_new_level_of_the_same_size_redraws_everything():
+    console = Backends.HeadlessConsole(SIZE, SIZE)
+    renderer = BasicEngine.FrameRenderer(console)
+    for seed in (1, 2):
+        level = make_level(seed)
+        player = gp.Piece(level, level.up_stairs, char='@')
+        view = level.get_view(player.location, 5)
+        level.add_to_explored(view)
+        assert renderer.draw(level, player, view) == (0, 0, SIZE, SIZE)
+        assert_same(console, full_redraw(level, player, view))
@@ -0,0 +1,30 @@
+"""
+LevelCache hands back what was put in, from the files or from the entries it keeps open
+"""
+import numpy as np
+
+import LevelCache
+
+
+def test_open_entries(tmp_path):
+    cache = LevelCache.LevelCache(str(tmp_path), open_entries=1)
+    tiles = np.arange(12, dtype=np.uint8).reshape(3, 4)
+    for key in ('a', 'b'):
+        cache.put(key, {'tiles': tiles}, {'key': key})
+
+    arrays, values = cache.get('a')
+    np.testing.assert_array_equal(arrays['tiles'], tiles)
+    assert values == {'key': 'a'}
+    assert cache.get('a')[0] is arrays
+
+    # only the last entry stays open, the first is read again
+    cache.get('b')
+    assert list(cache.recent) == ['b']
+    assert cache.get('a')[0] is not arrays
+
+    # writable loads are never shared
+    assert cache.get('b', mmap_mode=None)[0] is not cache.get('b', mmap_mode=None)[0]
+
+    cache.clear()
+    assert cache.get('a') == (None, None)
+    assert not cache.recent
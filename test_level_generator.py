@@ -0,0 +1,31 @@
+"""
+levels that are not square come out of LevelGenerator with the same axes as WorldMap points
+"""
+import pytest
+
+pytest.importorskip('tdl.map')
+
+import numpy as np
+
+import LevelGenerator as lg
+
+WIDTH, HEIGHT = 60, 40
+
+
+def test_non_square_level():
+    level = lg.generate_level(1, WIDTH, HEIGHT)
+    assert level.tile_flags.shape == (HEIGHT, WIDTH)
+    assert level.walk_map.shape == (WIDTH, HEIGHT)
+
+    dungeon = lg.build_world_map(level)
+    assert dungeon.explored.shape == (WIDTH, HEIGHT)
+    for x, y in (dungeon.up_stairs, dungeon.down_stairs):
+        assert 0 <= x < WIDTH and 0 <= y < HEIGHT
+        assert dungeon.tdl_map.walkable[x, y]
+    np.testing.assert_array_equal(dungeon.tdl_map.walkable, level.walk_map)
+    assert dungeon.get_path(dungeon.up_stairs, dungeon.down_stairs)
+
+
+def test_non_square_chunk_path():
+    dungeon = lg.build_world_map(lg.generate_level(2, WIDTH, HEIGHT))
+    assert dungeon.get_chunk_path(dungeon.up_stairs, dungeon.down_stairs)
@@ -0,0 +1,102 @@
+"""
+MapAnalysis areas, distances and flow fields against a plain breadth first search
+"""
+from collections import deque
+
+import numpy as np
+
+import MapAnalysis as ma
+
+MOVES = ((0, -1), (-1, 0), (1, 0), (0, 1))
+
+
+def random_walk_map(seed, shape=(40, 30), walkable=0.6):
+    return np.random.default_rng(seed).random(shape) < walkable
+
+
+def plain_bfs(walk_map, sources):
+    distance = np.full(walk_map.shape, -1, dtype=np.int32)
+    queue = deque()
+    for point in sources:
+        distance[point] = 0
+        queue.append(point)
+    while queue:
+        x, y = queue.popleft()
+        for dx, dy in MOVES:
+            point = (x + dx, y + dy)
+            if (0 <= point[0] < walk_map.shape[0] and 0 <= point[1] < walk_map.shape[1] and walk_map[point] and
+                    distance[point] < 0):
+                distance[point] = distance[x, y] + 1
+                queue.append(point)
+    return distance
+
+
+def walkable_points(walk_map, count, seed):
+    points = np.argwhere(walk_map)
+    rng = np.random.default_rng(seed)
+    return [tuple(point) for point in points[rng.choice(len(points), count, replace=False)].tolist()]
+
+
+def test_bfs_distance():
+    for seed in range(5):
+        walk_map = random_walk_map(seed)
+        sources = walkable_points(walk_map, 1 + seed % 3, seed)
+        np.testing.assert_array_equal(ma.bfs_distance(walk_map, sources), plain_bfs(walk_map, sources))
+
+
+def test_bfs_distance_limit():
+    walk_map = random_walk_map(1)
+    sources = walkable_points(walk_map, 1, 1)
+    expected = plain_bfs(walk_map, sources)
+    expected[expected > 5] = -1
+    np.testing.assert_array_equal(ma.bfs_distance(walk_map, sources, limit=5), expected)
+
+
+def test_label_components():
+    for seed in range(5):
+        walk_map = random_walk_map(seed, walkable=0.5)
+        labels, sizes = ma.label_components(walk_map)
+        np.testing.assert_array_equal(labels >= 0, walk_map)
+        assert sizes.sum() == walk_map.sum()
+        # every area is exactly what a search from any of it's points reaches
+        for label in range(len(sizes)):
+            point = tuple(np.argwhere(labels == label)[0].tolist())
+            np.testing.assert_array_equal(plain_bfs(walk_map, [point]) >= 0, labels == label)
+
+
+def test_component_map():
+    walk_map = np.zeros((5, 5), dtype=bool)
+    walk_map[0, :] = True
+    walk_map[2:, 2] = True
+    components = ma.ComponentMap(walk_map)
+    assert len(components) == 2
+    assert components.connected((0, 0), (0, 4))
+    assert not components.connected((0, 0), (4, 2))
+    assert not components.connected((1, 1), (1, 1))
+    assert components.get_mask(components.largest).sum() == 5
+    assert ma.ComponentMap(np.zeros((3, 3))).largest is None
+
+
+def test_move_source():
+    walk_map = random_walk_map(3, walkable=0.7)
+    source, target = walkable_points(walk_map, 2, 3)
+    distance = ma.bfs_distance(walk_map, [source])
+    if distance[target] < 0:
+        target = tuple(np.argwhere(distance > 0)[0].tolist())
+    np.testing.assert_array_equal(ma.move_source(distance, target), plain_bfs(walk_map, [target]))
+
+
+def test_flow_field_walks_downhill():
+    walk_map = random_walk_map(2, walkable=0.7)
+    targets = walkable_points(walk_map, 2, 2)
+    field = ma.FlowField(walk_map, targets)
+    points = [tuple(point) for point in np.argwhere(walk_map).tolist()]
+    steps = field.get_steps(points)
+    for point, step in zip(points, steps.tolist()):
+        distance = field.get_distance(point)
+        if distance > 0:
+            assert abs(step[0] - point[0]) + abs(step[1] - point[1]) == 1
+            assert field.get_distance(step) == distance - 1
+        else:
+            assert tuple(step) == point
+    assert field.get_step(targets[0]) == targets[0]
@@ -0,0 +1,134 @@
+"""
+ChunkMap generation, the compiled match index against the regex matching it replaced, and constrained generation
+"""
+import random
+import re
+
+import numpy as np
+
+from GenerationStats import GenerationStats
+import PuzzleGenerator as pg
+
+
+def test_constrained_counts_the_seed():
+    for chunk_limit in (1, 2, 10):
+        stats = GenerationStats()
+        world = pg.ChunkMap(100, 100, 5, pg.chunk_library(), seed=3, stats=stats)
+        world.generate_constrained(chunk_limit)
+        # placements leave out the seed chunk
+        assert stats.placements == chunk_limit - 1
+        assert (world.chunk_map != 0).sum() <= chunk_limit
+
+
+def test_tile_layers_follow_tile_flags():
+    world = pg.ChunkMap(50, 50, 5, pg.chunk_library(), seed=1)
+    world.generate(50, 200)
+    world.place_tiles_from_chunk_map()
+    walkable = world.tile_map_walkable
+    assert world.tile_map_walkable is walkable
+    assert (walkable == ((world.tile_flags & pg.TILE_WALKABLE) != 0)).all()
+
+    world.tile_map_walkable = ~walkable
+    assert (world.tile_map_walkable == ~walkable).all()
+    assert (world.tile_map_transparency == ((world.tile_flags & pg.TILE_TRANSPARENT) != 0)).all()
+
+    world.place_tiles_from_chunk_map()
+    assert (world.tile_map_walkable == walkable).all()
+
+
+def regex_candidates(world, location):
+    """
+    the (chunk, rotation) pairs the legacy regex matching allows at a location
+    """
+    search_term = re.compile(world.get_match_string_for_location(location))
+    world.create_search_dicts()
+    return {(key, rotation) for key, rotations in world.chunk_match_dict.items()
+            for rotation, connections in rotations.items() if search_term.fullmatch(connections) is not None}
+
+
+def assert_consistent(world):
+    """
+    every pair of placed neighbours matches, the chunk placed second matched the match string of the first
+    """
+    for location in zip(*np.nonzero(world.chunk_map)):
+        location = tuple(int(i) for i in location)
+        chunk = world.chunk_dict[int(world.chunk_map[location])]
+        rotation = int(world.rotation_map[location])
+        for side, point in enumerate(world.get_surrounding(location)):
+            if not world.in_bounds(point) or world.chunk_map[point] == 0:
+                continue
+            other = world.chunk_dict[int(world.chunk_map[point])]
+            other_rotation = int(world.rotation_map[point])
+            assert (re.fullmatch(other.get_match_string(side - 2, other_rotation),
+                                 chunk.get_connection(side, rotation)) is not None or
+                    re.fullmatch(chunk.get_match_string(side, rotation),
+                                 other.get_connection(side - 2, other_rotation)) is not None), (location, point)
+
+
+def test_mask_matches_regex():
+    world = pg.ChunkMap(50, 50, 5, pg.chunk_library(), seed=2)
+    world.generate(30, 200)
+    locations = [(row, column) for row in range(10) for column in range(10)]
+    for location in locations:
+        mask = world.get_match_mask_for_location(location)
+        assert set(world.match_index.get_candidates(mask)) == regex_candidates(world, location), location
+
+
+def test_choose_picks_a_candidate():
+    world = pg.ChunkMap(50, 50, 5, pg.chunk_library(), seed=2)
+    world.generate(30, 200)
+    rng = random.Random(1)
+    for location in list(world.next_available_points):
+        mask = world.get_match_mask_for_location(location)
+        candidates = world.match_index.get_candidates(mask)
+        for _ in range(5):
+            key, rotation = world.match_index.choose(mask, rng)
+            if candidates:
+                assert (key, rotation) in candidates
+            else:
+                assert key is None and rotation is None
+
+
+def test_generate_places_matching_chunks():
+    world = pg.ChunkMap(100, 100, 5, pg.chunk_library(), seed=4)
+    world.generate(200, 200)
+    assert_consistent(world)
+
+
+def test_constrained_places_matching_chunks():
+    for seed in range(4):
+        world = pg.ChunkMap(100, 100, 5, pg.chunk_library(), seed=seed)
+        world.generate_constrained(200)
+        assert_consistent(world)
+        # chunk 0 is never placed, the frontier is only empty locations
+        assert all(world.chunk_map[point] == 0 for point in world.next_available_points)
+
+
+def test_constrained_is_seeded():
+    maps = []
+    for _ in range(2):
+        world = pg.ChunkMap(100, 100, 5, pg.chunk_library(), seed=7)
+        world.generate_constrained(200)
+        maps.append((world.chunk_map.copy(), world.rotation_map.copy()))
+    np.testing.assert_array_equal(maps[0][0], maps[1][0])
+    np.testing.assert_array_equal(maps[0][1], maps[1][1])
+
+
+def test_undo_restores_placement():
+    world = pg.ChunkMap(50, 50, 5, pg.chunk_library(), seed=5)
+    world.seed_map()
+    allowed = world.match_index.full_mask & ~world.match_index.get_chunk_mask(0)
+    domains, heap = {}, []
+    for point in world.next_available_points:
+        world._push_domain(point, allowed, domains, heap)
+
+    before = (world.chunk_map.copy(), world.rotation_map.copy(), set(world.next_available_points), dict(domains))
+    for point in list(world.next_available_points):
+        for key, rotation in world.match_index.get_candidates(domains[point]):
+            changes, _ = world._place_option(point, key, rotation, allowed, domains)
+            world._queue_neighbours(changes, domains, heap)
+            world._undo_placement(changes, domains)
+            np.testing.assert_array_equal(world.chunk_map, before[0])
+            np.testing.assert_array_equal(world.rotation_map, before[1])
+            assert set(world.next_available_points) == before[2]
+            assert domains == before[3]